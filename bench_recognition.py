@@ -0,0 +1,226 @@
+# Бенчмарк распознавания на записанных файлах, без звуковых устройств и GUI.
+# Прогоняет WAV/PCM (int16 моно 16 кГц) через тот же конвейер Recorder, что и живой захват,
+# для одного и двух одновременных потоков и печатает RTF, задержку финализации, CPU и память.
+# --mode both сравнивает распознавание в потоках и в процессах-воркерах, включая отзывчивость
+# «GUI»: поток-зонд в основном процессе тикает каждые 10 мс и меряет опоздание тиков.
+#
+# Пример:
+#   python bench_recognition.py client.wav advisor.wav --speed 0
+#   python bench_recognition.py client.wav advisor.wav --speed 1 --streaming --json bench.json
+#   python bench_recognition.py client.wav advisor.wav --mode both --channels 6
+#   python bench_recognition.py client.wav advisor.wav --vad both   # сколько декодера экономит детектор речи
+#   python bench_recognition.py client.wav advisor.wav --speed 1 --streaming --reorder-window 0   # порядок финализации
+#   python bench_recognition.py client.wav advisor.wav --speed 1 --channels 6 --overload-policy coalesce
+
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+
+from metrics import LatencyStats, stages
+from profiler import SamplingProfiler
+from model_registry import MODEL_PATH, get_model
+from recorder import Recorder, MODE_THREAD, MODE_PROCESS
+from replay import audio_seconds
+from devices import NullBackend
+from quality import QualityScheduler
+from timeline import REORDER_WINDOW
+from ring_buffer import POLICIES, POLICY_DROP_OLDEST
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def peak_rss_mb():
+    """Пиковая (не текущая) память основного процесса, МБ, одинаково на всех платформах."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # На Linux ru_maxrss в килобайтах, на macOS — в байтах
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        # Windows: пик рабочего набора
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return peak / 2 ** 20 if peak is not None else None
+    return None
+
+
+class UiProbe:
+    """Поток, изображающий цикл событий GUI: насколько опаздывают его тики."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lag = LatencyStats(window=100000)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        expected = time.perf_counter() + self.interval
+        while not self._stop.wait(max(0.0, expected - time.perf_counter())):
+            now = time.perf_counter()
+            self.lag.add(max(0.0, now - expected))
+            expected = now + self.interval
+
+
+def run(files, mode, vad, args):
+    channels = [(name, name, None) for name in files]
+    # --switch-delay: путь старта с переключением вывода, которое идёт столько секунд
+    backend = NullBackend(args.switch_delay) if args.switch_delay is not None else None
+    recorder = Recorder(streaming=args.streaming, blocksize=args.blocksize, model_path=args.model,
+                        replay_files=files, replay_speed=args.speed, channels=channels, mode=mode,
+                        # Журнал на диск не пишем: запись не должна попадать в замер
+                        log_format=None, vad=vad, output_backend=backend,
+                        quality=QualityScheduler(level=args.quality) if args.quality else None,
+                        reorder_window=args.reorder_window, overload_policy=args.overload_policy)
+    finalize_latency = LatencyStats(window=100000)
+    starts = []
+
+    def on_segment(seg):
+        finalize_latency.add(time.monotonic() - seg.end)
+        starts.append(seg.start)
+    recorder.segments.subscribe(on_segment)
+
+    # Воркеры запускаем заранее, чтобы загрузка моделей не попала в замер
+    recorder._ensure_recognizers()
+    stages.clear()
+    audio = sum(audio_seconds(path) for path in files.values())
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    with UiProbe() as probe:
+        recorder.start()
+        # Сколько start() держит вызывающий поток (в GUI — до первого кадра захвата)
+        start_seconds = time.perf_counter() - started
+        recorder.wait()
+    wall = time.perf_counter() - started
+    # В режиме процессов это CPU только основного процесса (захват и сборка результатов)
+    cpu = time.process_time() - cpu_started
+
+    stats = recorder.get_stats()
+    recorder.close()
+    decode = sum(s.get("decode_seconds", 0.0) for s in stats.values())
+    return {
+        "mode": mode,
+        "vad": vad,
+        "streams": len(files),
+        "speed": args.speed,
+        "blocksize": recorder.blocksize,
+        "audio_seconds": round(audio, 2),
+        "wall_seconds": round(wall, 2),
+        "start_seconds": round(start_seconds, 3),
+        # Пропускная способность: секунд аудио, распознанных за секунду
+        "throughput": round(audio / wall, 2) if wall else None,
+        # Сколько секунд декодера уходит на секунду аудио (суммарно по потокам)
+        "rtf_decode": round(decode / audio, 3) if audio else None,
+        # Время прогона к длине самой длинной записи: при speed=0 — запас по реальному времени
+        "rtf_wall": round(wall / max(audio_seconds(p) for p in files.values()), 3),
+        "cpu_seconds": round(cpu, 2),
+        "cpu_percent": round(100 * cpu / wall, 1) if wall else None,
+        # Пик за весь процесс бенчмарка (включая предыдущие прогоны), без процессов-воркеров
+        "peak_rss_mb": round(peak_rss_mb() or 0, 1),
+        "segments": len(recorder.segments),
+        # При speed=0 кольца всегда ждут декодер (block без таймаута)
+        "overload_policy": recorder.overload_policy,
+        "dropped_blocks": sum(s["dropped_blocks"] for s in stats.values()),
+        "overflow_blocks": sum(s["overflow_blocks"] for s in stats.values()),
+        "coalesced_blocks": sum(s["coalesced_blocks"] for s in stats.values()),
+        # Тишина, не поданная в декодер, и оценка сэкономленного на ней времени декодера
+        "vad_skipped_seconds": round(sum(s.get("skipped_seconds", 0.0) for s in stats.values()), 2),
+        "vad_saved_seconds": round(sum(s.get("vad_saved_seconds", 0.0) for s in stats.values()), 2),
+        "vad_cpu_seconds": round(sum(s.get("vad_seconds", 0.0) for s in stats.values()), 3),
+        "finalize_latency": finalize_latency.summary(),
+        "ui_tick_lag": probe.lag.summary(),
+        "caption_latency": recorder.get_caption_latency() if args.streaming else None,
+        # Задержки по стадиям: колбэк, ожидание в кольце, AcceptWaveform, финализация
+        "stages": stages.snapshot(),
+        # Уровни качества и причины переключений (--quality)
+        "quality": recorder.quality.get_stats() if recorder.quality else None,
+        # Сведение потоков по времени речи: сколько реплик переставлено, сколько ждали дольше окна
+        # и сколько соседних пар в транскрипте всё равно идут не по времени начала
+        "timeline": recorder.timeline.get_stats(),
+        "order_inversions": sum(1 for a, b in zip(starts, starts[1:]) if b < a),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк распознавания на файлах")
+    parser.add_argument("client", help="WAV/PCM с речью клиента")
+    parser.add_argument("advisor", nargs="?", help="WAV/PCM с речью советника (для двух потоков)")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="1 — реальное время, 0 — максимально быстро (по умолчанию)")
+    parser.add_argument("--streaming", action="store_true", help="потоковый режим с PartialResult")
+    parser.add_argument("--blocksize", type=int, default=None)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--mode", choices=[MODE_THREAD, MODE_PROCESS, "both"], default=MODE_THREAD,
+                        help="распознавание в потоках, в процессах-воркерах или сравнение обоих")
+    parser.add_argument("--channels", type=int, default=0,
+                        help="дополнительно прогнать N каналов, циклически повторяя файлы")
+    parser.add_argument("--vad", choices=["on", "off", "both"], default="on",
+                        help="детектор речи перед декодером; both — прогнать с ним и без него")
+    parser.add_argument("--switch-delay", type=float, default=None,
+                        help="включить переключение вывода (заглушка) с такой задержкой, с")
+    parser.add_argument("--metrics", help="выгрузить гистограммы стадий последнего прогона (.prom или .json)")
+    parser.add_argument("--profile", help="включить сэмплирующий профайлер и сохранить стеки в файл")
+    parser.add_argument("--quality", metavar="LEVEL",
+                        help="начать с уровня качества LEVEL и включить планировщик (см. quality.py)")
+    parser.add_argument("--reorder-window", type=float, default=REORDER_WINDOW,
+                        help="сколько секунд реплика ждёт отстающий поток (0 — порядок финализации)")
+    parser.add_argument("--overload-policy", choices=POLICIES, default=POLICY_DROP_OLDEST,
+                        help="что делать, когда декодер отстаёт от захвата (при --speed больше 0)")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    modes = [MODE_THREAD, MODE_PROCESS] if args.mode == "both" else [args.mode]
+    vad_options = {"on": [True], "off": [False], "both": [False, True]}[args.vad]
+    if MODE_THREAD in modes:
+        load_started = time.perf_counter()
+        get_model(args.model)
+        print(f"Модель загружена за {time.perf_counter() - load_started:.2f} с")
+
+    configs = [{"client": args.client}]
+    if args.advisor:
+        configs.append({"client": args.client, "advisor": args.advisor})
+    if args.channels > len(configs):
+        sources = itertools.cycle([args.client] + ([args.advisor] if args.advisor else []))
+        configs.append({f"ch{i + 1}": next(sources) for i in range(args.channels)})
+
+    profiler = SamplingProfiler()
+    if args.profile:
+        profiler.start()
+    results = []
+    for files in configs:
+        for mode in modes:
+            for vad in vad_options:
+                result = run(files, mode, vad, args)
+                results.append(result)
+                print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.profile:
+        profiler.stop()
+        print(profiler.report())
+        profiler.dump(args.profile)
+    if args.metrics:
+        stages.export(args.metrics)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
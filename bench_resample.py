@@ -0,0 +1,208 @@
+# Проверка и бенчмарк пересчёта захвата в 16 кГц моно (resample.py) на записанных файлах.
+# Из WAV корпуса (int16 моно 16 кГц) делается «родной» звук устройств — 44.1/48 кГц, моно и
+# стерео — эталонным спектральным пересчётом, затем Resampler блоками захвата возвращает его
+# в 16 кГц и результат сравнивается с эталонным пересчётом того же сигнала. Печатает SNR в полосе
+# речи (в полосе пропускания фильтра, до 6 кГц) и во всей полосе — против эталона, пропущенного
+# через частотную характеристику того же фильтра, чтобы спад фильтра у 7 кГц не считался ошибкой,
+# — подавление наложения частот выше 8 кГц, совпадение результата при разных размерах блока и CPU
+# на секунду аудио.
+#
+# Пример:
+#   python bench_resample.py client.wav advisor.wav
+#   python bench_resample.py client.wav --rates 44100 48000 --channels 2 --block 0.1 --json resample.json
+#   python bench_resample.py client.wav --write native/   # файлы для bench_recognition.py
+
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+from replay import read_pcm
+from resample import Resampler, TARGET_RATE, design_filter
+
+
+def reference_resample(x, rate, new_rate):
+    """Эталон: пересчёт через БПФ всего сигнала с обрезкой спектра выше новой частоты Найквиста."""
+    n = round(len(x) * new_rate / rate)
+    spectrum = np.fft.rfft(x)
+    out = np.zeros(n // 2 + 1, dtype=complex)
+    k = min(len(spectrum), len(out))
+    out[:k] = spectrum[:k]
+    return np.fft.irfft(out, n) * n / len(x)
+
+
+def lowpass(x, rate, cutoff):
+    spectrum = np.fft.rfft(x)
+    spectrum[np.fft.rfftfreq(len(x), 1 / rate) > cutoff] = 0
+    return np.fft.irfft(spectrum, len(x))
+
+
+def shape(x, resampler):
+    """x (TARGET_RATE), пропущенный через частотную характеристику фильтра resampler."""
+    if resampler.up == resampler.down:
+        return x
+    h, _, delay = design_filter(resampler.up, resampler.down)
+    # Фильтр работает на частоте in_rate * up; характеристика — БПФ с шагом около 2 Гц без задержки
+    # фильтра (окно при up = 1 чуть несимметрично, поэтому не только АЧХ, но и фаза); усиление up уже в h
+    rate = resampler.in_rate * resampler.up
+    n = 1 << int(np.ceil(np.log2(rate / 2)))
+    grid = np.fft.rfftfreq(n, 1 / rate)
+    keep = grid <= TARGET_RATE
+    grid = grid[keep]
+    h_f = np.fft.rfft(h[:-1], n)[keep] * np.exp(2j * np.pi * grid * delay / rate) / resampler.up
+    freqs = np.fft.rfftfreq(len(x), 1 / TARGET_RATE)
+    response = np.interp(freqs, grid, h_f.real) + 1j * np.interp(freqs, grid, h_f.imag)
+    return np.fft.irfft(np.fft.rfft(x) * response, len(x))
+
+
+def snr_db(reference, signal):
+    noise = np.mean((reference - signal) ** 2)
+    return round(float(10 * np.log10(np.mean(reference ** 2) / noise)), 1) if noise else float("inf")
+
+
+def to_int16(x):
+    return np.clip(np.rint(x), -32768, 32767).astype(np.int16)
+
+
+def native(x, rate, channels):
+    """Сигнал корпуса в формате устройства: int16 с чередованием каналов."""
+    y = reference_resample(x, TARGET_RATE, rate)
+    if channels == 2:
+        # Каналы с разной громкостью: сведение должно их усреднить
+        y = np.stack([y, 0.6 * y], axis=1)
+    return to_int16(y).tobytes()
+
+
+def run_blocks(resampler, data, frames):
+    step = frames * resampler.channels * 2
+    view = memoryview(data)
+    resampler.reset()
+    return b"".join(resampler.process(view[i:i + step]) for i in range(0, len(data), step))
+
+
+def check(x, rate, channels, block, speech_band):
+    data = native(x, rate, channels)
+    frames = round(rate * block)
+    resampler = Resampler(rate, TARGET_RATE, channels)
+    out = np.frombuffer(run_blocks(resampler, data, frames), dtype=np.int16).astype(np.float64)
+
+    # Эталон считается по тому же сведённому сигналу, что получает Resampler
+    mono = np.frombuffer(data, dtype=np.int16).reshape(-1, channels).mean(axis=1)
+    reference = reference_resample(mono, rate, TARGET_RATE)
+    # Во всей полосе сравниваем с тем, что должен дать именно этот фильтр
+    shaped = shape(reference, resampler)
+    # Края: у Resampler нет входа до начала и после конца файла
+    edge = resampler.taps
+    n = min(len(out), len(reference)) - edge
+    out, reference, shaped = out[edge:n], reference[edge:n], shaped[edge:n]
+
+    # Размер блока не должен влиять на результат
+    other = run_blocks(resampler, data, max(1, frames // 3) + 7)
+    same = other == run_blocks(resampler, data, frames)
+    return {
+        "rate": rate,
+        "channels": channels,
+        "taps": resampler.taps,
+        "snr_speech_db": snr_db(lowpass(reference, TARGET_RATE, speech_band),
+                                lowpass(out, TARGET_RATE, speech_band)),
+        "snr_full_db": snr_db(shaped, out),
+        "block_invariant": same,
+    }
+
+
+def alias_rejection(rate, channels):
+    """Худший уровень (дБ) на выходе для тонов между 8 кГц и частотой Найквиста устройства."""
+    resampler = Resampler(rate, TARGET_RATE, channels)
+    worst = -np.inf
+    t = np.arange(rate) / rate
+    for freq in np.arange(TARGET_RATE / 2 * 1.1, rate / 2, 500):
+        tone = np.repeat(to_int16(16000 * np.sin(2 * np.pi * freq * t)), channels).tobytes()
+        resampler.reset()
+        out = np.frombuffer(resampler.process(tone), dtype=np.int16)[resampler.taps:-resampler.taps]
+        level = np.sqrt(np.mean(out.astype(np.float64) ** 2)) / (16000 / np.sqrt(2))
+        worst = max(worst, 20 * np.log10(level) if level else -120.0)
+    return round(float(worst), 1) if np.isfinite(worst) else None
+
+
+def cpu_cost(data, rate, channels, block, repeat):
+    resampler = Resampler(rate, TARGET_RATE, channels)
+    frames = round(rate * block)
+    seconds = len(data) / 2 / channels / rate
+    started = time.process_time()
+    for _ in range(repeat):
+        run_blocks(resampler, data, frames)
+    cpu = (time.process_time() - started) / repeat
+    return {
+        "rate": rate,
+        "channels": channels,
+        "block_seconds": block,
+        # Миллисекунд CPU на секунду аудио; 10 мс/с — 1 % одного ядра
+        "cpu_ms_per_second": round(1000 * cpu / seconds, 3),
+    }
+
+
+def write_wav(path, data, rate, channels):
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка и бенчмарк пересчёта захвата в 16 кГц моно")
+    parser.add_argument("files", nargs="+", help="WAV/PCM корпуса, int16 моно 16 кГц")
+    parser.add_argument("--rates", type=int, nargs="+", default=[44100, 48000])
+    parser.add_argument("--channels", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--block", type=float, default=0.5, help="длительность блока захвата, с")
+    parser.add_argument("--speech-band", type=float, default=6000,
+                        help="верх полосы речи для SNR, Гц; фильтр ровный до 6 кГц (−3.5 дБ на 7 кГц, −6 дБ на 7.2 кГц)")
+    parser.add_argument("--min-snr", type=float, default=40.0,
+                        help="минимальный SNR в полосе речи, дБ; ниже — код возврата 1")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов для замера CPU")
+    parser.add_argument("--write", metavar="DIR", help="сохранить «родные» файлы для bench_recognition.py")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    results = {"checks": [], "alias_rejection_db": {}, "cpu": []}
+    ok = True
+    for path in args.files:
+        x = np.frombuffer(read_pcm(path), dtype=np.int16).astype(np.float64)
+        for rate in args.rates:
+            for channels in args.channels:
+                result = check(x, rate, channels, args.block, args.speech_band)
+                result["file"] = path
+                ok = ok and result["block_invariant"] and result["snr_speech_db"] >= args.min_snr
+                results["checks"].append(result)
+                print(json.dumps(result, ensure_ascii=False))
+                if args.write:
+                    os.makedirs(args.write, exist_ok=True)
+                    name = os.path.splitext(os.path.basename(path))[0]
+                    write_wav(os.path.join(args.write, f"{name}_{rate}_{channels}.wav"),
+                              native(x, rate, channels), rate, channels)
+
+    data = np.frombuffer(read_pcm(args.files[0]), dtype=np.int16).astype(np.float64)
+    for rate in args.rates:
+        for channels in args.channels:
+            key = f"{rate}x{channels}"
+            results["alias_rejection_db"][key] = alias_rejection(rate, channels)
+            for block in sorted({args.block, 0.1}):
+                results["cpu"].append(cpu_cost(native(data, rate, channels), rate, channels, block, args.repeat))
+    print(json.dumps({"alias_rejection_db": results["alias_rejection_db"]}, ensure_ascii=False))
+    for row in results["cpu"]:
+        print(json.dumps(row, ensure_ascii=False))
+
+    results["ok"] = ok
+    print("OK" if ok else f"FAIL: SNR в полосе речи ниже {args.min_snr} дБ или результат зависит от размера блока")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import collections
+import re
+
+# Грубая оценка: для русского текста у моделей Cohere выходит ~3 символа на токен
+CHARS_PER_TOKEN = 3
+
+TRANSCRIPT_HEADER = "Транскрипт разговора (последние реплики):"
+SUMMARY_HEADER = "Краткое содержание предыдущей части беседы:"
+RETRIEVED_HEADER = "Из прошлых разговоров (журналы звонков):"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s|\n")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def extractive_summary(previous, turns, max_tokens):
+    """Сжатие вытесненных реплик без обращения к LLM: первое предложение каждой."""
+    names = {"user": "Пользователь", "assistant": "Ассистент"}
+    lines = previous.splitlines() if previous else []
+    for role, content in turns:
+        first = _SENTENCE_END.split(content.strip(), 1)[0][:200]
+        lines.append(f"{names.get(role, role)}: {first}")
+    # Не даём сводке расти бесконечно: старейшие строки уходят первыми
+    while lines and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ContextBuilder:
+    """Собирает сообщения для LLM в пределах бюджета токенов.
+
+    В запрос попадают: системный промпт со сводкой старых ходов, недавние
+    ходы чата и скользящее окно последних реплик транскрипта. Вытесненные
+    ходы один раз сворачиваются в сводку, которая дальше только дополняется,
+    поэтому размер запроса не растёт с длиной звонка.
+    retriever(query, max_tokens) — найденное в прошлых звонках (LogIndex.retrieve);
+    оно занимает не больше retrieval_share бюджета, за счёт окна транскрипта.
+    """
+
+    def __init__(self, system_prompt, segments=None, token_budget=3000,
+                 transcript_share=0.5, summary_tokens=300, summarizer=extractive_summary,
+                 retriever=None, retrieval_share=0.2):
+        self.system_prompt = system_prompt
+        # SegmentStore рекордера; новые реплики забираются инкрементально
+        self.segments = segments
+        self.token_budget = token_budget
+        self.transcript_share = transcript_share
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.retriever = retriever
+        self.retrieval_share = retrieval_share
+        self.summary = ""
+        self.turns = collections.deque()
+        self._transcript = collections.deque()
+        self._transcript_tokens = 0
+        self._last_seq = 0
+        self.last_report = {}
+        # Окно транскрипта и найденное в журналах, попавшие в последний запрос
+        self.last_transcript = ""
+        self.last_retrieved = ""
+
+    @property
+    def _history_budget(self):
+        return int(self.token_budget * (1 - self.transcript_share)) - estimate_tokens(self.system_prompt)
+
+    def add_turn(self, role, content):
+        self.turns.append((role, content, estimate_tokens(content)))
+        self._compact()
+
+    def _compact(self):
+        budget = self._history_budget - estimate_tokens(self.summary)
+        evicted = []
+        # Последний обмен репликами всегда остаётся целиком
+        while len(self.turns) > 2 and sum(t[2] for t in self.turns) > budget:
+            role, content, _ = self.turns.popleft()
+            evicted.append((role, content))
+        if evicted:
+            self.summary = self.summarizer(self.summary, evicted, self.summary_tokens)
+
+    def _pull_transcript(self):
+        if self.segments is None:
+            return
+        for seg in self.segments.segments_since(self._last_seq):
+            line = seg.line()
+            tokens = estimate_tokens(line)
+            self._transcript.append((line, tokens))
+            self._transcript_tokens += tokens
+            self._last_seq = seg.seq
+        limit = int(self.token_budget * self.transcript_share)
+        while self._transcript and self._transcript_tokens > limit:
+            _, tokens = self._transcript.popleft()
+            self._transcript_tokens -= tokens
+
+    def transcript_text(self, max_tokens=None):
+        """Последние реплики транскрипта, укладывающиеся в max_tokens."""
+        self._pull_transcript()
+        lines, used = [], 0
+        for line, tokens in reversed(self._transcript):
+            if max_tokens is not None and used + tokens > max_tokens:
+                break
+            lines.append(line)
+            used += tokens
+        return "\n".join(reversed(lines)), used
+
+    def build(self, query, retrieve=False):
+        """retrieve=True — добавить найденное по query в прошлых звонках."""
+        system = self.system_prompt
+        if self.summary:
+            system += f"\n\n{SUMMARY_HEADER}\n{self.summary}"
+        system_tokens = estimate_tokens(system)
+        history_tokens = sum(t[2] for t in self.turns)
+        query_tokens = estimate_tokens(query)
+
+        retrieved, retrieved_tokens = "", 0
+        if retrieve and self.retriever is not None:
+            retrieved = self.retriever(query, int(self.token_budget * self.retrieval_share))
+            retrieved_tokens = estimate_tokens(retrieved) if retrieved else 0
+        self.last_retrieved = retrieved
+
+        # Транскрипту достаётся всё, что осталось от бюджета, но не больше его доли
+        room = self.token_budget - system_tokens - history_tokens - query_tokens - retrieved_tokens
+        room = min(room, int(self.token_budget * self.transcript_share))
+        transcript, transcript_tokens = self.transcript_text(max(room, 0))
+        self.last_transcript = transcript
+
+        content = query
+        if transcript:
+            content = f"{TRANSCRIPT_HEADER}\n{transcript}\n\n{query}"
+        if retrieved:
+            content = f"{RETRIEVED_HEADER}\n{retrieved}\n\n{content}"
+
+        messages = [{"role": "system", "content": system}]
+        messages += [{"role": role, "content": text} for role, text, _ in self.turns]
+        messages.append({"role": "user", "content": content})
+
+        self.last_report = {
+            "system": system_tokens,
+            "history": history_tokens,
+            "history_turns": len(self.turns),
+            "transcript": transcript_tokens,
+            "retrieved": retrieved_tokens,
+            "query": query_tokens,
+            "total": system_tokens + history_tokens + transcript_tokens + retrieved_tokens + query_tokens,
+            "budget": self.token_budget,
+        }
+        return messages
@@ -0,0 +1,282 @@
+import concurrent.futures
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+# sounddevice нужен только для живого захвата: без PortAudio работает воспроизведение файлов
+try:
+    import sounddevice as sd
+except (ImportError, OSError):
+    sd = None
+
+# Куда переключать вывод системы на время прослушивания и куда возвращать после.
+# Названия для nircmd: .\nircmd.exe showsounddevices; для pactl: pactl list short sinks
+CAPTURE_OUTPUT = "CABLE-A Input"
+RESTORE_OUTPUT = "Headset Earphone"
+
+
+class DeviceRegistry:
+    """Кэш списка звуковых устройств.
+
+    PortAudio перечисляет устройства один раз при инициализации, поэтому
+    новые устройства видны только после её перезапуска. refresh() делает это
+    не чаще min_refresh_interval и только когда можно (is_idle): у открытых
+    потоков перезапуск выбил бы устройство из-под ног. Поиск сначала смотрит
+    в кэш и обновляет его только при промахе. watch() в фоне ловит
+    подключение и отключение устройств; пока кто-то держит in_use()
+    (запуск захвата, открытый поток), фоновая проверка PortAudio не трогает.
+    """
+
+    def __init__(self, min_refresh_interval=2.0):
+        self.min_refresh_interval = min_refresh_interval
+        self._devices = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._users = 0
+        self._watch_stop = None
+        self.refreshes = 0
+
+    def devices(self):
+        with self._lock:
+            if self._devices is None:
+                self._devices = self._query(reinit=False)
+                self._refreshed_at = time.monotonic()
+            return self._devices
+
+    @staticmethod
+    def _query(reinit):
+        if sd is None:
+            return []
+        if reinit:
+            # Единственный способ увидеть подключённые после старта устройства: PortAudio
+            # перечисляет их только в Pa_Initialize, а публичного API для этого у sounddevice нет.
+            # _terminate()/_initialize() — тонкие обёртки над Pa_Terminate/Pa_Initialize, проверены
+            # на sounddevice 0.3.15, 0.4.6, 0.5.1 и 0.5.6. Pa_Terminate закрывает все потоки
+            # процесса, поэтому зовётся только без in_use()
+            sd._terminate()
+            sd._initialize()
+        return [dict(dev) for dev in sd.query_devices()]
+
+    def refresh(self, force=False, background=False):
+        """Перечитывает устройства. Возвращает True, если список изменился.
+
+        background=True (фоновая проверка) — не перечитывать, пока устройства
+        кто-то использует: запуск захвата уже выбрал номера, а перезапуск
+        PortAudio закрыл бы открытые потоки.
+        """
+        with self._lock:
+            if background and self._users:
+                return False
+            if not force and time.monotonic() - self._refreshed_at < self.min_refresh_interval:
+                return False
+            old = self._devices
+            try:
+                self._devices = self._query(reinit=old is not None)
+            except Exception as e:
+                print(f"[ERROR] Не удалось перечитать устройства: {e}")
+                return False
+            self._refreshed_at = time.monotonic()
+            self.refreshes += 1
+            changed = old is not None and _signature(old) != _signature(self._devices)
+            subscribers = list(self._subscribers) if changed else []
+        for callback in subscribers:
+            callback(self._devices)
+        return changed
+
+    def find_input(self, name_like, refresh_on_miss=True):
+        index = _find(self.devices(), name_like, "max_input_channels")
+        if index is None and refresh_on_miss and self.refresh():
+            index = _find(self.devices(), name_like, "max_input_channels")
+        return index
+
+    def input_format(self, index, max_channels=2):
+        """(частота, число каналов) устройства ввода без пересчёта хост-API.
+
+        Больше max_channels не берём: речь сводится в моно, лишние каналы
+        только добавляют работы колбэку.
+        """
+        dev = self.devices()[index]
+        return int(dev["default_samplerate"]), max(1, min(dev["max_input_channels"], max_channels))
+
+    @contextlib.contextmanager
+    def in_use(self):
+        """Пока блок выполняется, фоновая проверка не перезапускает PortAudio."""
+        with self._lock:
+            self._users += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._users -= 1
+
+    def on_change(self, callback):
+        # callback(devices) — в потоке, который заметил изменение
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def watch(self, interval=5.0, is_idle=lambda: True):
+        """Фоновая проверка подключения устройств, пока is_idle() истинно."""
+        if self._watch_stop is not None:
+            return
+        self._watch_stop = threading.Event()
+
+        def run():
+            while not self._watch_stop.wait(interval):
+                if is_idle() and self.refresh(background=True):
+                    print("[DEBUG] Список звуковых устройств изменился")
+
+        threading.Thread(target=run, name="device-watch", daemon=True).start()
+
+    def stop_watch(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+
+
+def _signature(devices):
+    return [(d["name"], d["max_input_channels"], d["max_output_channels"]) for d in devices]
+
+
+def _find(devices, name_like, channels_key):
+    for i, dev in enumerate(devices):
+        if name_like.lower() in dev["name"].lower() and dev[channels_key] > 0:
+            return i
+    return None
+
+
+class NircmdBackend:
+    """Windows: устройство по умолчанию через nircmdc.exe.
+
+    nircmd не умеет сообщить текущее устройство, поэтому подтверждением
+    служит код возврата.
+    """
+
+    def __init__(self, path="nircmdc.exe", timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+
+    def set_default_output(self, name):
+        result = subprocess.run([self.path, "setdefaultsounddevice", name, "0"],
+                                timeout=self.timeout, capture_output=True)
+        return result.returncode == 0
+
+    def get_default_output(self):
+        return None
+
+
+class PactlBackend:
+    """Linux: PulseAudio или PipeWire (pipewire-pulse) через pactl.
+
+    Переключение подтверждается чтением устройства по умолчанию.
+    """
+
+    def __init__(self, path="pactl", timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+
+    def set_default_output(self, name):
+        subprocess.run([self.path, "set-default-sink", name], timeout=self.timeout,
+                       capture_output=True, check=True)
+        current = self.get_default_output()
+        return current is not None and name.lower() in current.lower()
+
+    def get_default_output(self):
+        result = subprocess.run([self.path, "get-default-sink"], timeout=self.timeout,
+                                capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+
+class NullBackend:
+    """Ничего не переключает: headless-прогоны и бенчмарки.
+
+    delay имитирует время переключения настоящего бэкенда.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.current = None
+        self.calls = []
+
+    def set_default_output(self, name):
+        time.sleep(self.delay)
+        self.calls.append(name)
+        self.current = name
+        return True
+
+    def get_default_output(self):
+        return self.current
+
+
+def default_backend():
+    if sys.platform == "win32":
+        return NircmdBackend()
+    if shutil.which("pactl") and os.environ.get("XDG_RUNTIME_DIR"):
+        return PactlBackend()
+    return NullBackend()
+
+
+class OutputSwitcher:
+    """Переключение вывода системы в фоне: захват не ждёт, пока оно закончится.
+
+    Переключения выполняются по очереди в одном потоке, так что «включить»
+    и «вернуть» не обгоняют друг друга. switch() возвращает Future с True,
+    если бэкенд подтвердил переключение.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or default_backend()
+        self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="output-switch")
+        # Устройство до первого переключения, если бэкенд умеет его узнать
+        self.previous = None
+        self._remembered = False
+        self.last_result = None
+        self.last_seconds = None
+
+    def switch(self, name):
+        return self._executor.submit(self._switch, name, True)
+
+    def restore(self, fallback):
+        """Возвращает вывод, который был до switch(), или fallback."""
+        return self._executor.submit(self._restore, fallback)
+
+    def _restore(self, fallback):
+        name = self.previous or fallback
+        self.previous = None
+        self._remembered = False
+        return self._switch(name, False)
+
+    def _switch(self, name, remember):
+        started = time.perf_counter()
+        if remember and not self._remembered:
+            self.previous = self.current()
+            self._remembered = True
+        try:
+            ok = self.backend.set_default_output(name)
+        except Exception as e:
+            print(f"[ERROR] Не удалось переключить вывод на {name}: {e}")
+            ok = False
+        self.last_seconds = time.perf_counter() - started
+        self.last_result = ok
+        if ok:
+            print(f"[DEBUG] Вывод переключён на {name} за {self.last_seconds:.2f} с")
+        else:
+            print(f"[ERROR] Переключение вывода на {name} не подтверждено")
+        return ok
+
+    def current(self):
+        try:
+            return self.backend.get_default_output()
+        except Exception:
+            return None
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+# Общий реестр на процесс: устройства перечисляются один раз
+registry = DeviceRegistry()
@@ -0,0 +1,193 @@
+import asyncio
+import collections
+import json
+import os
+import threading
+import time
+
+import cohere
+import httpx
+from cohere.core.api_error import ApiError
+
+from metrics import LatencyStats, stages, STAGE_LLM_START, STAGE_LLM_FIRST_TOKEN, STAGE_LLM_COMPLETE
+
+COHERE_MODEL = "command-a-03-2025"
+
+
+class CohereBackend:
+    """Потоковый чат Cohere v2 поверх одного долгоживущего пула соединений.
+
+    base_url позволяет направить запросы на mock_llm_server.py вместо облака.
+    Повторы делает LLMClient, поэтому собственные повторы SDK отключены.
+    """
+
+    def __init__(self, api_key, model=COHERE_MODEL, base_url=None, timeout=30.0):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.timeout = timeout
+        self._http = None
+        self._client = None
+
+    def _connect(self):
+        # Клиент создаётся в цикле событий LLMClient, к которому привязываются соединения
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=120),
+        )
+        kwargs = {"httpx_client": self._http}
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        self._client = cohere.AsyncClientV2(self.api_key, **kwargs)
+
+    async def stream(self, messages, max_tokens=None):
+        """Асинхронный генератор кусков текста ответа; max_tokens — потолок длины ответа."""
+        if self._client is None:
+            self._connect()
+        kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+        async for event in self._client.chat_stream(model=self.model, messages=messages,
+                                                    request_options={"max_retries": 0}, **kwargs):
+            if event and event.type == "content-delta":
+                yield event.delta.message.content.text
+
+    @staticmethod
+    def is_retryable(error):
+        # Повторяем сетевые сбои, таймауты, 429 и ошибки сервера; 4xx — нет
+        if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+            return True
+        if isinstance(error, ApiError):
+            return error.status_code == 429 or (error.status_code or 0) >= 500
+        return False
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+
+
+def create_backend(path="credentions.json"):
+    """Бэкенд по настройкам: ключ из credentions.json, адрес — из COHERE_BASE_URL."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            secrets = json.load(f)
+    except FileNotFoundError:
+        secrets = {}
+    base_url = os.getenv("COHERE_BASE_URL") or secrets.get("COHERE_BASE_URL")
+    api_key = secrets.get("COHERE_API_KEY")
+    if base_url and not api_key:
+        # Локальному серверу ключ не нужен, но SDK требует непустой
+        api_key = "mock"
+    return CohereBackend(api_key, model=secrets.get("COHERE_MODEL", COHERE_MODEL), base_url=base_url)
+
+
+async def _next(agen, timeout=None):
+    try:
+        return await asyncio.wait_for(agen.__anext__(), timeout)
+    except StopAsyncIteration:
+        return None
+
+
+class LLMClient:
+    """Запросы к LLM в собственном потоке с циклом asyncio.
+
+    В полёте не больше одного запроса: submit() отменяет предыдущий стрим,
+    и его соединение закрывается сразу, не дожидаясь конца ответа.
+    Пока не пришёл первый кусок, сбой повторяется до retries раз с
+    экспоненциальной паузой; после первого куска — нет, чтобы не дублировать текст.
+    on_chunk(text) и on_done(text, error) вызываются в потоке клиента;
+    для отменённого запроса on_done не вызывается.
+    """
+
+    def __init__(self, backend, retries=2, retry_delay=0.5, first_token_timeout=20.0):
+        self.backend = backend
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.first_token_timeout = first_token_timeout
+        self.counters = {"requests": 0, "completed": 0, "cancelled": 0, "retries": 0, "errors": 0}
+        # Время до первого токена и полное время ответа
+        self.ttft = LatencyStats()
+        self.total = LatencyStats()
+        self.tokens_per_second = collections.deque(maxlen=100)
+        self._current = None
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+
+    def submit(self, messages, on_chunk, on_done, requested_at=None, max_tokens=None):
+        """requested_at — time.perf_counter() нажатия, для замера от действия пользователя."""
+        self.cancel()
+        self._current = asyncio.run_coroutine_threadsafe(
+            self._run(messages, on_chunk, on_done, requested_at or time.perf_counter(), max_tokens), self.loop)
+        return self._current
+
+    def cancel(self):
+        if self._current is not None and not self._current.done():
+            self._current.cancel()
+
+    async def _run(self, messages, on_chunk, on_done, requested_at, max_tokens):
+        self.counters["requests"] += 1
+        started = time.perf_counter()
+        stages.observe(STAGE_LLM_START, started - requested_at)
+        text = ""
+        chunks = 0
+        attempt = 0
+        while True:
+            agen = self.backend.stream(messages, max_tokens)
+            try:
+                chunk = await _next(agen, self.first_token_timeout)
+                first_at = time.perf_counter()
+                if chunk is not None:
+                    self.ttft.add(first_at - started)
+                    stages.observe(STAGE_LLM_FIRST_TOKEN, first_at - requested_at)
+                while chunk is not None:
+                    text += chunk
+                    chunks += 1
+                    on_chunk(chunk)
+                    chunk = await _next(agen)
+                break
+            except asyncio.CancelledError:
+                self.counters["cancelled"] += 1
+                print(f"[DEBUG] LLM: запрос отменён после {chunks} кусков")
+                raise
+            except Exception as e:
+                if chunks == 0 and attempt < self.retries and self.backend.is_retryable(e):
+                    attempt += 1
+                    self.counters["retries"] += 1
+                    print(f"[DEBUG] LLM: повтор {attempt}/{self.retries} после ошибки: {e!r}")
+                    await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+                    continue
+                self.counters["errors"] += 1
+                print(f"[ERROR] LLM: {e!r}")
+                on_done(text, e)
+                return text
+            finally:
+                await agen.aclose()
+
+        finished = time.perf_counter()
+        self.total.add(finished - started)
+        stages.observe(STAGE_LLM_COMPLETE, finished - requested_at)
+        # Куски стрима Cohere примерно соответствуют токенам
+        if chunks > 1 and finished > first_at:
+            self.tokens_per_second.append(chunks / (finished - first_at))
+        self.counters["completed"] += 1
+        on_done(text, None)
+        return text
+
+    def get_stats(self):
+        rates = list(self.tokens_per_second)
+        return {
+            **self.counters,
+            "ttft": self.ttft.summary(),
+            "total": self.total.summary(),
+            "tokens_per_second": round(sum(rates) / len(rates), 1) if rates else None,
+        }
+
+    def close(self):
+        if not self.loop.is_running():
+            return
+        self.cancel()
+        try:
+            asyncio.run_coroutine_threadsafe(self.backend.aclose(), self.loop).result(timeout=2)
+        except Exception as e:
+            print(f"[ERROR] LLM: не удалось закрыть соединения: {e!r}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
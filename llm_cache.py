@@ -0,0 +1,128 @@
+import collections
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+# Имя файла кэша; кладётся рядом с журналами звонков: ответы строятся из их текста
+CACHE_FILE = "llm_cache.json"
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Регистр, «ё», пунктуация и пробелы не должны давать разные ключи."""
+    text = text.lower().replace("ё", "е")
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+
+class ResponseCache:
+    """Кэш ответов LLM: LRU на max_entries записей с временем жизни ttl секунд.
+
+    Ключ — нормализованный запрос плюс отпечаток контекста, в который
+    входят системный промпт и окно транскрипта. История чата в отпечаток
+    не входит: повторное нажатие с тем же вопросом по тому же разговору
+    должно попасть в кэш, хотя в истории уже лежит первый ответ.
+    Записи хранятся с куском стрима как единицей, чтобы ответ из кэша
+    проигрывался тем же путём, что и живой. Кэш переживает перезапуск:
+    после каждой новой записи он сохраняется в path (атомарной заменой файла).
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=200, ttl=1800):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+        # Сколько секунд ожидания LLM сэкономили попадания
+        self.saved_seconds = 0.0
+        self._load()
+
+    @staticmethod
+    def key(query, *context):
+        digest = hashlib.sha1()
+        for part in context:
+            digest.update(_SPACES.sub(" ", part).strip().encode("utf-8"))
+            digest.update(b"\0")
+        return f"{normalize(query)}|{digest.hexdigest()}"
+
+    def get(self, key):
+        """Куски ответа или None. Попадание делает запись самой свежей."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["created"] > self.ttl:
+                del self._entries[key]
+                self.counters["expired"] += 1
+                entry = None
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            self.saved_seconds += entry["seconds"]
+            return list(entry["chunks"])
+
+    def put(self, key, chunks, seconds):
+        """Сохраняет ответ; seconds — сколько он шёл от LLM."""
+        with self._lock:
+            self._entries[key] = {"chunks": list(chunks), "seconds": seconds, "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evicted"] += 1
+            snapshot = list(self._entries.items())
+        self._save(snapshot)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._save([])
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "hit_ratio": round(self.counters["hits"] / lookups, 3) if lookups else None,
+                "saved_seconds": round(self.saved_seconds, 2),
+            }
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                items = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Не удалось прочитать кэш ответов {self.path}: {e}")
+            return
+        now = time.time()
+        # В файле записи идут от старых к свежим — порядок LRU сохраняется
+        for key, entry in items:
+            if now - entry["created"] <= self.ttl:
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        print(f"[DEBUG] Кэш ответов: загружено {len(self._entries)} записей")
+
+    def _save(self, items):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with self._save_lock:
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(items, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"[ERROR] Не удалось сохранить кэш ответов: {e}")
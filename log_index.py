@@ -0,0 +1,263 @@
+import array
+import bisect
+import functools
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+_WORD = re.compile(r"\w+")
+_TEXT_LINE = re.compile(r"\[(\d\d:\d\d:\d\d)\] (.+?): (.*)")
+_LOG_NAME = re.compile(r"log_(\d{8})(?:\.\d+)?\.(txt|jsonl)$")
+
+# Окончания для облегчённого стемминга по длине, длинные проверяются первыми
+_ENDINGS = """
+    иями ями ами ого его ому ему ыми ими ешь ете ите ишь ует уют ают яют
+    ая яя ое ее ые ие ый ий ой ей ую юю их ых ом ем ам ям ах ях ов ев ью ия ии ию ея
+    ть ет ут ют ит ат ят ла ло ли ил ал ял ел
+    а я о е ы и у ю й ь
+""".split()
+_ENDINGS_BY_LENGTH = [(n, frozenset(e for e in _ENDINGS if len(e) == n))
+                      for n in sorted({len(e) for e in _ENDINGS}, reverse=True)]
+_MIN_STEM = 3
+
+@functools.lru_cache(maxsize=200000)
+def _stem_lower(word):
+    if word[-2:] in ("ся", "сь") and len(word) - 2 >= _MIN_STEM:
+        word = word[:-2]
+    for n, endings in _ENDINGS_BY_LENGTH:
+        if len(word) - n >= _MIN_STEM and word[-n:] in endings:
+            return word[:-n]
+    return word
+
+
+def stem(word):
+    """Облегчённый стемминг русских слов: регистр, «ё» и одно окончание."""
+    return _stem_lower(word.lower().replace("ё", "е"))
+
+
+def terms(text):
+    return [_stem_lower(w) for w in _WORD.findall(text.lower().replace("ё", "е"))]
+
+
+# Служебные слова и слова-обращения к поиску: в запросе они только мешают
+_STOP_WORDS = """
+    и в во на с со к ко о об от до по за из у не ни но а же ли бы то что как так
+    это этот эта эти тот та те он она оно они я мы вы ты его ее их мне мой наш
+    про для при над под без уже еще там тут где когда чем всё все весь
+    клиент клиента клиенту советник говорил говорила сказал сказала прошлый прошлой раз
+"""
+STOP_WORDS = frozenset(terms(_STOP_WORDS))
+
+
+class LogIndex:
+    """Инвертированный индекс по журналам разговоров log_YYYYMMDD*.txt|jsonl.
+
+    Документ — одна реплика. Для каждого терма (основы слова) хранится
+    возрастающий массив номеров реплик, поэтому поиск — пересечение
+    коротких списков без чтения файлов. Фраза ищется пересечением по всем
+    её термам с проверкой порядка слов у кандидатов. Индекс строится в
+    фоновом потоке и догоняет журналы по смещению в каждом файле: читаются
+    только дописанные с прошлого прохода целые строки.
+    """
+
+    def __init__(self, directory=".", interval=2.0):
+        self.directory = directory
+        self.interval = interval
+        # Реплики: (время time.time(), роль, текст, номер файла)
+        self.docs = []
+        self.files = []
+        self.postings = {}
+        self._offsets = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.ready = threading.Event()
+        self.build_seconds = None
+
+    # --- построение ---
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-index", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        started = time.perf_counter()
+        self.update()
+        self.build_seconds = time.perf_counter() - started
+        print(f"[DEBUG] Индекс журналов: {len(self.docs)} реплик, {len(self.postings)} термов "
+              f"за {self.build_seconds:.2f} с")
+        self.ready.set()
+        while not self._stop.wait(self.interval):
+            self.update()
+
+    def update(self):
+        """Дочитывает новые строки журналов. Возвращает число добавленных реплик."""
+        added = 0
+        paths = glob.glob(os.path.join(self.directory, "log_*.txt")) + \
+            glob.glob(os.path.join(self.directory, "log_*.jsonl"))
+        for path in sorted(paths):
+            match = _LOG_NAME.search(os.path.basename(path))
+            if match is None:
+                continue
+            try:
+                added += self._read_tail(path, match.group(1), match.group(2) == "jsonl")
+            except OSError as e:
+                print(f"[ERROR] Индекс журналов: {path}: {e}")
+        return added
+
+    def _read_tail(self, path, day, is_jsonl):
+        offset = self._offsets.get(path, 0)
+        if os.path.getsize(path) <= offset:
+            return 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # Недописанную последнюю строку оставляем до следующего прохода
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return 0
+        self._offsets[path] = offset + end
+        if path not in self.files:
+            self.files.append(path)
+        file_id = self.files.index(path)
+
+        records = []
+        midnight = datetime.strptime(day, "%Y%m%d").timestamp()
+        for line in data[:end].decode("utf-8", errors="replace").splitlines():
+            record = self._parse(line, midnight, is_jsonl)
+            if record is not None:
+                records.append((*record, file_id))
+        # Пачками, чтобы поиск не ждал построения всего индекса
+        for i in range(0, len(records), 1000):
+            with self._lock:
+                for record in records[i:i + 1000]:
+                    self._add(record)
+        return len(records)
+
+    @staticmethod
+    def _parse(line, midnight, is_jsonl):
+        if is_jsonl:
+            try:
+                record = json.loads(line)
+                return record["time"], record["role"], record["text"]
+            except (ValueError, KeyError, TypeError):
+                return None
+        match = _TEXT_LINE.match(line)
+        if match is None:
+            return None
+        h, m, sec = match.group(1).split(":")
+        return midnight + int(h) * 3600 + int(m) * 60 + int(sec), match.group(2), match.group(3)
+
+    def _add(self, record):
+        doc = len(self.docs)
+        self.docs.append(record)
+        for term in set(terms(record[2])):
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array.array("I")
+            postings.append(doc)
+
+    # --- поиск ---
+    def search(self, query, limit=5, before=None):
+        """Номера реплик, лучшие первыми.
+
+        Слова в кавычках ищутся фразой, остальные — все сразу; если все
+        сразу нигде не встречаются, реплики ранжируются по редкости
+        найденных слов (idf). Фраза со словом, которого нет в индексе,
+        не встречается нигде — тогда результат пуст. before — не старше
+        этого time.time(), чтобы текущий звонок не выдавался за прошлый.
+        """
+        phrases = [terms(p) for p in re.findall(r'"([^"]+)"', query)]
+        words = [t for t in terms(re.sub(r'"[^"]*"', " ", query)) if t not in STOP_WORDS]
+        required = {t for p in phrases for t in p} | set(words)
+        if not required:
+            return []
+        with self._lock:
+            if any(t not in self.postings for p in phrases for t in p):
+                return []
+            phrases = [p for p in phrases if len(p) > 1]
+            lists = [self.postings.get(t) for t in required]
+            if all(lists):
+                docs = self._intersect_recent(sorted(lists, key=len), limit, phrases, before)
+                if docs or phrases:
+                    return docs
+            return self._rank(words, limit, before)
+
+    def _intersect_recent(self, lists, limit, phrases, before):
+        # Идём по самому короткому списку с конца: нужны только limit самых свежих
+        shortest, others = lists[0], lists[1:]
+        found = []
+        for doc in reversed(shortest):
+            if before is not None and self.docs[doc][0] >= before:
+                continue
+            if all(self._contains(postings, doc) for postings in others) and \
+                    all(self._has_phrase(doc, p) for p in phrases):
+                found.append(doc)
+                if len(found) == limit:
+                    break
+        return found
+
+    @staticmethod
+    def _contains(postings, doc):
+        i = bisect.bisect_left(postings, doc)
+        return i < len(postings) and postings[i] == doc
+
+    def _has_phrase(self, doc, phrase):
+        text = terms(self.docs[doc][2])
+        k = len(phrase)
+        return any(text[i:i + k] == phrase for i in range(len(text) - k + 1))
+
+    def _filter(self, docs, before):
+        if before is None:
+            return docs
+        return [d for d in docs if self.docs[d][0] < before]
+
+    def _rank(self, words, limit, before):
+        total = len(self.docs) or 1
+        scores = {}
+        for term in set(words):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(total / len(postings)) + 1
+            # Для частых слов смотрим только свежие реплики
+            for doc in postings[-2000:]:
+                scores[doc] = scores.get(doc, 0.0) + idf
+        docs = self._filter(sorted(scores, key=lambda d: (scores[d], d), reverse=True), before)
+        return docs[:limit]
+
+    def snippet(self, doc, around=1):
+        """Реплика с соседними из того же файла."""
+        with self._lock:
+            file_id = self.docs[doc][3]
+            first = max(0, doc - around)
+            lines = []
+            for d in range(first, min(len(self.docs), doc + around + 1)):
+                ts, role, text, f = self.docs[d]
+                if f == file_id:
+                    lines.append(f"[{datetime.fromtimestamp(ts).strftime('%d.%m.%Y %H:%M')}] {role}: {text}")
+        return "\n".join(lines)
+
+    def retrieve(self, query, max_tokens, before=None, limit=5, estimate=None):
+        """Текст лучших совпадений с контекстом, укладывающийся в max_tokens."""
+        parts, used = [], 0
+        for doc in self.search(query, limit, before):
+            text = self.snippet(doc)
+            tokens = estimate(text) if estimate else len(text) // 3 + 1
+            if used + tokens > max_tokens:
+                break
+            parts.append(text)
+            used += tokens
+        return "\n---\n".join(parts)
+
+    def __len__(self):
+        return len(self.docs)
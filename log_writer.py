@@ -0,0 +1,144 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+FORMAT_TEXT = "text"    # [ЧЧ:ММ:СС] роль: текст — как раньше, log_YYYYMMDD.txt
+FORMAT_JSONL = "jsonl"  # по объекту JSON на строку, log_YYYYMMDD.jsonl
+
+# Политика надёжности: flush — сбрасывать буфер раз в flush_interval,
+# fsync — вдобавок просить ОС записать данные на диск после каждой пачки
+DURABILITY_FLUSH = "flush"
+DURABILITY_FSYNC = "fsync"
+
+
+class TranscriptLogWriter:
+    """Журнал реплик в отдельном потоке: распознавание никогда не ждёт диск.
+
+    Имя файла выбирается по дате каждой записи, так что сессия через полночь
+    пишет уже в новый файл. При max_bytes > 0 файл дня ротируется по размеру:
+    log_YYYYMMDD.txt, log_YYYYMMDD.1.txt, log_YYYYMMDD.2.txt…
+    """
+
+    def __init__(self, directory=".", fmt=FORMAT_TEXT, flush_interval=1.0,
+                 durability=DURABILITY_FLUSH, max_bytes=0):
+        self.directory = directory
+        self.fmt = fmt
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.batches = 0
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._path = None
+        self._day = None
+        self._part = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="transcript-log", daemon=True)
+        self._thread.start()
+        # Дописать накопленное, даже если приложение закрыли без close()
+        atexit.register(self.close)
+
+    def write(self, role, text, start=None, end=None, confidence=None):
+        # Только кладёт запись в очередь: без ожидания и без ввода-вывода
+        self._queue.put({
+            "time": time.time(),
+            "role": role,
+            "text": text,
+            "start": start,
+            "end": end,
+            "confidence": confidence,
+        })
+
+    def write_segment(self, seg):
+        self.write(seg.role, seg.text, seg.wall_start, seg.wall_end, seg.confidence)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write_batch(batch)
+                batch, deadline = [], None
+                continue
+            if record is None:
+                self._write_batch(batch)
+                if self._file:
+                    self._file.close()
+                return
+            batch.append(record)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            # Пачка копится до конца интервала; flush_interval=0 — писать сразу
+            if time.monotonic() >= deadline:
+                self._write_batch(batch)
+                batch, deadline = [], None
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+        try:
+            for record in batch:
+                self._file_for(record["time"]).write(self._format(record))
+            self._file.flush()
+            if self.durability == DURABILITY_FSYNC:
+                os.fsync(self._file.fileno())
+        except (OSError, ValueError) as e:
+            # ValueError — запись в уже закрытый файл
+            print(f"[ERROR] Не удалось записать журнал: {e}")
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    def _file_for(self, ts):
+        day = datetime.fromtimestamp(ts).strftime('%Y%m%d')
+        if day != self._day:
+            self._day = day
+            self._part = 0
+            self._open()
+        elif self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._part += 1
+            self._open()
+        return self._file
+
+    def _open(self):
+        try:
+            if self._file:
+                # Перед сменой файла дописываем накопленное в старый
+                self._file.flush()
+                if self.durability == DURABILITY_FSYNC:
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+            ext = "jsonl" if self.fmt == FORMAT_JSONL else "txt"
+            suffix = f".{self._part}" if self._part else ""
+            self._path = os.path.join(self.directory, f"log_{self._day}{suffix}.{ext}")
+            self._file = open(self._path, "a", encoding="utf-8")
+        except OSError:
+            # Нет прав или места: следующая пачка попробует открыть файл заново
+            self._day = None
+            raise
+        # Продолжение уже заполненного файла после перезапуска
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._part += 1
+            self._open()
+
+    def _format(self, record):
+        if self.fmt == FORMAT_JSONL:
+            return json.dumps(record, ensure_ascii=False) + "\n"
+        timestamp = datetime.fromtimestamp(record["time"]).strftime('%H:%M:%S')
+        return f"[{timestamp}] {record['role']}: {record['text']}\n"
@@ -3,29 +3,32 @@
 # и VB-Cable для перенаправления системного звука
 
 import sounddevice as sd
-import queue
 import json
-import subprocess
 import time
 import threading
 import signal
-from vosk import Model, KaldiRecognizer
+from vosk import KaldiRecognizer
+from model_registry import get_model, MODEL_PATH
+from ring_buffer import CaptureRing
+from devices import registry, OutputSwitcher, CAPTURE_OUTPUT, RESTORE_OUTPUT
 
 # === Константы ===
-MODEL_PATH = "vosk-model-small-ru-0.22"
-NIRCMD_PATH = "nircmdc.exe"
-VBCABLE_NAME = "CABLE-A Input"         # Переключение системного звука сюда
-JABRA_NAME = "Headset Earphone"        # Возврат звука после работы
+VBCABLE_NAME = CAPTURE_OUTPUT         # Переключение системного звука сюда
+JABRA_NAME = RESTORE_OUTPUT            # Возврат звука после работы
 SAMPLE_RATE = 16000
+# Потоковый режим: блоки по 100 мс и промежуточные гипотезы (PartialResult)
+STREAMING = True
+BLOCK_SIZE = 1600 if STREAMING else 8000
+PARTIAL_INTERVAL = 0.1                 # Не чаще, чем раз в 100 мс
 
 # Названия устройств брать тут cmd: .\nircmd.exe showsounddevices
 
-# === Очереди ===
-q_mic = queue.Queue()
-q_vb = queue.Queue()
+# === Кольца блоков: выделены заранее, колбэк только копирует в слот ===
+q_mic = CaptureRing(32, BLOCK_SIZE * 2)
+q_vb = CaptureRing(32, BLOCK_SIZE * 2)
 
 # === Распознаватели ===
-model = Model(MODEL_PATH)
+model = get_model(MODEL_PATH)
 rec_mic = KaldiRecognizer(model, SAMPLE_RATE)
 rec_vb = KaldiRecognizer(model, SAMPLE_RATE)
 
@@ -36,47 +39,60 @@ def handle_sigint(sig, frame):
     stop_flag = True
 signal.signal(signal.SIGINT, handle_sigint)
 
-# === Переключение аудио устройства вывода
-def set_default_output(device_name):
-    subprocess.call([NIRCMD_PATH, "setdefaultsounddevice", device_name, "0"])
-    time.sleep(1)
+# === Переключение аудио устройства вывода: nircmd на Windows, pactl на Linux, в фоне
+switcher = OutputSwitcher()
 
-# === Поиск устройства по названию
-def find_device(name_like):
-    for i, dev in enumerate(sd.query_devices()):
-        if name_like.lower() in dev["name"].lower() and dev["max_input_channels"] > 0:
-            return i
-    return None
+# === Поиск устройства по названию (список устройств кэшируется)
+find_device = registry.find_input
 
 # === Callback'и ===
 def callback_mic(indata, frames, time, status):
-    q_mic.put(bytes(indata))
+    if status:
+        q_mic.note_status(status)
+    q_mic.put(indata)
 
 def callback_vb(indata, frames, time, status):
-    q_vb.put(bytes(indata))
+    if status:
+        q_vb.note_status(status)
+    q_vb.put(indata)
+
+# === Распознавание блока: итог или промежуточная гипотеза
+last_partial = {}
+last_poll = {}
+def decode(rec, data, captured_at, label):
+    # data — memoryview слота кольца, vosk принимает только bytes
+    if rec.AcceptWaveform(bytes(data)):
+        last_partial.pop(label, None)
+        result = json.loads(rec.Result())
+        if result.get("text"):
+            latency = time.monotonic() - captured_at
+            print(f"{label}: {result['text']}  [{latency * 1000:.0f} мс]")
+    elif STREAMING and time.monotonic() - last_poll.get(label, 0) >= PARTIAL_INTERVAL:
+        last_poll[label] = time.monotonic()
+        partial = json.loads(rec.PartialResult()).get("partial", "")
+        if partial and partial != last_partial.get(label):
+            last_partial[label] = partial
+            latency = time.monotonic() - captured_at
+            print(f"   {label} … {partial}  [{latency * 1000:.0f} мс]")
 
 # === Потоки ===
 def listen_mic(device_id):
-    with sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=8000, dtype='int16',
+    with sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=BLOCK_SIZE, dtype='int16',
                            channels=1, callback=callback_mic, device=device_id):
         while not stop_flag:
-            if not q_mic.empty():
-                data = q_mic.get()
-                if rec_mic.AcceptWaveform(data):
-                    result = json.loads(rec_mic.Result())
-                    if result.get("text"):
-                        print("👨‍💼 СОВЕТНИК:", result["text"])
+            item = q_mic.get(timeout=0.2)
+            if item is None:
+                continue
+            decode(rec_mic, item[1], item[0], "👨‍💼 СОВЕТНИК")
 
 def listen_vbcable(device_id):
-    with sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=8000, dtype='int16',
+    with sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=BLOCK_SIZE, dtype='int16',
                            channels=1, callback=callback_vb, device=device_id):
         while not stop_flag:
-            if not q_vb.empty():
-                data = q_vb.get()
-                if rec_vb.AcceptWaveform(data):
-                    result = json.loads(rec_vb.Result())
-                    if result.get("text"):
-                        print("🧑‍💼 КЛИЕНТ:", result["text"])
+            item = q_vb.get(timeout=0.2)
+            if item is None:
+                continue
+            decode(rec_vb, item[1], item[0], "🧑‍💼 КЛИЕНТ")
 
 # === Главная логика ===
 if __name__ == "__main__":
@@ -93,7 +109,8 @@ if __name__ == "__main__":
 
         print("🔈 Убедитесь, что включена галочка 'Прослушивать это устройство' для CABLE-A Output.")
         print(f"🔄 Переключаем вывод системы на {VBCABLE_NAME}...")
-        set_default_output(VBCABLE_NAME)
+        # Не ждём: захват стартует сразу, звук в кабеле появится после переключения
+        switcher.switch(VBCABLE_NAME)
 
         print("🎤 Слушаем микрофон и системный звук...\nНажмите Ctrl+C для завершения.")
         t1 = threading.Thread(target=listen_mic, args=(mic_id,), daemon=True)
@@ -104,11 +121,13 @@ if __name__ == "__main__":
 
         while not stop_flag:
             time.sleep(0.5)
+        print("📊 Микрофон:", q_mic.stats())
+        print("📊 CABLE-A:", q_vb.stats())
 
     except Exception as e:
         print(f"❌ Ошибка: {e}")
 
     finally:
         print(f"\n🔁 Возвращаем звук на {JABRA_NAME}...")
-        set_default_output(JABRA_NAME)
+        switcher.restore(JABRA_NAME).result()
         print("👋 Готово.")
@@ -1,9 +1,55 @@
+import time
+_started_at = time.perf_counter()
+
 from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QTimer
 from overlay_ui import OverlayUI
+from llm_backend import LLMClient, create_backend
+import os
 import sys
 
+
+def selftest():
+    """Окно с подсказками собирается и сворачивает диалог без LLM и звука:
+    QT_QPA_PLATFORM=offscreen python main_overlay.py --selftest"""
+    window = OverlayUI(llm=LLMClient(create_backend()), suggest=True)
+    ok = window.gpt_window is not None and window.gpt_window.suggestions is not None
+    for _ in range(2):
+        window.toggle_transcript()
+    ok = ok and window._show_text and window.transcript_frame.isVisibleTo(window)
+    print("[DEBUG] Подсказки:", window.gpt_window.suggestions.get_stats())
+    window.recorder.close()
+    window.llm.close()
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = OverlayUI()
+    if "--selftest" in sys.argv[1:]:
+        sys.exit(selftest())
+    # Ключ и адрес API читаются здесь, а не при создании окна; соединение открывается при первом запросе
+    llm = LLMClient(create_backend())
+    # ADVISOR_SERVICE=127.0.0.1:8766 — не распознавать самим, а читать transcript_service.py
+    recorder = None
+    if os.getenv("ADVISOR_SERVICE"):
+        from transcript_service import TranscriptClient, parse_address
+        recorder = TranscriptClient(*parse_address(os.getenv("ADVISOR_SERVICE")))
+    elif os.getenv("ADVISOR_QUALITY") == "1":
+        # Модель и настройки распознавания подстраиваются под нагрузку на CPU
+        from recorder import Recorder
+        from quality import QualityScheduler
+        recorder = Recorder(streaming=True, quality=QualityScheduler())
+    # ADVISOR_HUD=1 — показать HUD задержек сразу; ADVISOR_METRICS=metrics.prom — выгружать метрики;
+    # ADVISOR_SUGGEST=1 — упреждающие подсказки после реплик клиента
+    window = OverlayUI(started_at=_started_at, llm=llm, hud=os.getenv("ADVISOR_HUD") == "1",
+                       metrics_path=os.getenv("ADVISOR_METRICS"), recorder=recorder,
+                       suggest=os.getenv("ADVISOR_SUGGEST") == "1")
     window.show()
+    # Дописать журнал и остановить воркеры распознавания при выходе
+    app.aboutToQuit.connect(window.recorder.close)
+    app.aboutToQuit.connect(llm.close)
+    app.aboutToQuit.connect(window.export_metrics)
+    # Первый тик цикла событий — окно уже отрисовано
+    QTimer.singleShot(0, lambda: print(f"[DEBUG] Окно показано через {time.perf_counter() - _started_at:.2f} с после запуска"))
     sys.exit(app.exec())
\ No newline at end of file
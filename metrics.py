@@ -0,0 +1,152 @@
+import bisect
+import collections
+import json
+import os
+import threading
+
+# Стадии конвейера: от звука до текста на экране и до ответа LLM
+STAGE_CALLBACK = "capture_callback"    # время внутри колбэка захвата
+STAGE_QUEUE_WAIT = "queue_wait"        # от захвата блока до подачи в декодер
+STAGE_RESAMPLE = "resample"            # сведение каналов и пересчёт частоты блока
+STAGE_DECODE = "accept_waveform"       # AcceptWaveform одного блока
+STAGE_FINALIZE = "finalize"            # от конца речи до готовой реплики
+STAGE_REORDER = "reorder"              # ожидание реплики в сведении диалога по времени
+STAGE_DISPLAY = "display"              # от конца речи до реплики на экране
+STAGE_PROMPT = "llm_prompt"            # сборка контекста запроса
+STAGE_LLM_START = "llm_request"        # от нажатия до отправки запроса в цикле клиента
+STAGE_LLM_FIRST_TOKEN = "llm_first_token"
+STAGE_LLM_COMPLETE = "llm_complete"
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyStats:
+    """Скользящее окно замеров задержки (в секундах) с перцентилями."""
+
+    def __init__(self, window=500):
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self.count = 0
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": 0}
+
+        def pct(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "count": count,
+            "mean_ms": round(1000 * sum(samples) / len(samples), 1),
+            "p50_ms": round(1000 * pct(0.50), 1),
+            "p95_ms": round(1000 * pct(0.95), 1),
+            "max_ms": round(1000 * samples[-1], 1),
+        }
+
+
+class Histogram(LatencyStats):
+    """Окно для перцентилей плюс накопительные корзины для экспорта в Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=500):
+        super().__init__(window)
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def add(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.bucket_counts[index] += 1
+            self.total += seconds
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self.count = 0
+            self.bucket_counts = [0] * (len(self.buckets) + 1)
+            self.total = 0.0
+
+    def cumulative(self):
+        # (граница, число замеров не больше неё), последняя граница — +Inf
+        with self._lock:
+            counts = list(self.bucket_counts)
+            total = self.total
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        running, result = 0, []
+        for bound, n in zip(bounds, counts):
+            running += n
+            result.append((bound, running))
+        return result, total
+
+
+class StageMetrics:
+    """Гистограммы задержек по стадиям конвейера с экспортом в JSON и Prometheus.
+
+    observe() можно звать из любого потока, в том числе из колбэка захвата:
+    там только короткая неконкурентная блокировка гистограммы.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, Histogram())
+        histogram.add(seconds)
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+    def snapshot(self):
+        with self._lock:
+            stages = dict(self._stages)
+        return {stage: histogram.summary() for stage, histogram in stages.items()}
+
+    def prometheus_text(self, name="advisor_stage_seconds"):
+        with self._lock:
+            stages = dict(self._stages)
+        lines = [f"# HELP {name} Задержка стадий конвейера распознавания и LLM",
+                 f"# TYPE {name} histogram"]
+        for stage, histogram in sorted(stages.items()):
+            buckets, total = histogram.cumulative()
+            for bound, count in buckets:
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {buckets[-1][1]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Пишет метрики в файл: .json — сводка с перцентилями, иначе текст Prometheus."""
+        if path.endswith(".json"):
+            data = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        else:
+            data = self.prometheus_text()
+        # Атомарная замена: сборщик (node_exporter textfile) не увидит полфайла
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+# Общие метрики стадий процесса
+stages = StageMetrics()
@@ -0,0 +1,199 @@
+# Локальный заменитель Cohere Chat API v2 (POST /v2/chat, stream=True) для проверки
+# задержек, повторов и отмены без сети и без ключа. Отдаёт SSE в формате Cohere
+# с настраиваемыми временем до первого токена, паузой между токенами и сбоями.
+#
+# Пример:
+#   python mock_llm_server.py --port 8765 --ttft 0.4 --token-delay 0.03
+#   COHERE_BASE_URL=http://127.0.0.1:8765 python main_overlay.py
+#   python mock_llm_server.py --selftest      # TTFT, токены/с, повторы и отмена через LLMClient
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+REPLY = ("Клиент интересуется условиями и сроками. Уточните сумму, срок и цель, "
+         "затем предложите подходящий вариант и назовите следующий шаг. ")
+
+
+class MockServer:
+    def __init__(self, ttft=0.3, token_delay=0.02, tokens=60, fail_first=0):
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.tokens = tokens
+        # Сколько первых запросов ответить 503 — для проверки повторов
+        self.fail_first = fail_first
+        self.stats = {"requests": 0, "completed": 0, "disconnected": 0, "failed": 0, "connections": 0}
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            # keep-alive: на одном соединении может прийти несколько запросов
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                path, body = request
+                if path != "/v2/chat":
+                    await self._send_json(writer, 404, {"message": "not found"})
+                    continue
+                self.stats["requests"] += 1
+                if self.fail_first > 0:
+                    self.fail_first -= 1
+                    self.stats["failed"] += 1
+                    await self._send_json(writer, 503, {"message": "mock overloaded"})
+                    continue
+                await self._stream(writer, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # Клиент закрыл соединение посреди ответа — так выглядит отмена
+            self.stats["disconnected"] += 1
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        _, path, _ = line.decode("latin-1").split(" ", 2)
+        length = 0
+        while True:
+            header = (await reader.readline()).decode("latin-1").strip()
+            if not header:
+                break
+            name, _, value = header.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        body = json.loads(await reader.readexactly(length)) if length else {}
+        return path, body
+
+    @staticmethod
+    async def _send_json(writer, status, payload):
+        data = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} Mock\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    async def _stream(self, writer, body):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        messages = body.get("messages") or [{}]
+        query = str(messages[-1].get("content", ""))[-80:]
+        words = f"Тестовый ответ на «{query}». ".split(" ")
+        # max_tokens запроса ограничивает ответ, как у настоящего API
+        tokens = min(self.tokens, body.get("max_tokens") or self.tokens)
+        while len(words) < tokens:
+            words += REPLY.split(" ")
+
+        await asyncio.sleep(self.ttft)
+        await self._event(writer, {"type": "message-start", "id": "mock", "delta": {"message": {"role": "assistant"}}})
+        await self._event(writer, {"type": "content-start", "index": 0,
+                                   "delta": {"message": {"content": {"type": "text", "text": ""}}}})
+        for i, word in enumerate(words[:tokens]):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            await self._event(writer, {"type": "content-delta", "index": 0,
+                                       "delta": {"message": {"content": {"text": word + " "}}}})
+        await self._event(writer, {"type": "content-end", "index": 0})
+        await self._event(writer, {"type": "message-end",
+                                   "delta": {"finish_reason": "COMPLETE",
+                                             "usage": {"tokens": {"output_tokens": tokens}}}})
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        self.stats["completed"] += 1
+
+    @staticmethod
+    async def _event(writer, payload):
+        data = f"event: {payload['type']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+
+def selftest(args):
+    """Прогон LLMClient против локального сервера: метрики, повтор после 503 и отмена."""
+    import threading
+    from llm_backend import CohereBackend, LLMClient
+
+    server = MockServer(args.ttft, args.token_delay, args.tokens, fail_first=1)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    port = asyncio.run_coroutine_threadsafe(server.start(port=0), loop).result()
+
+    client = LLMClient(CohereBackend("mock", base_url=f"http://127.0.0.1:{port}"), retry_delay=0.1)
+    messages = [{"role": "user", "content": "Что хочет клиент?"}]
+    done = threading.Event()
+    results = []
+
+    def on_done(text, error):
+        results.append((text, error))
+        done.set()
+
+    # Первый запрос получает 503 и проходит со второй попытки
+    for _ in range(3):
+        done.clear()
+        client.submit(messages, lambda chunk: None, on_done).result()
+
+    # Второй запрос посреди стрима отменяет первый
+    chunks = []
+    first = client.submit(messages, chunks.append, on_done)
+    time.sleep(args.ttft + args.token_delay * 5)
+    cancelled_at = time.perf_counter()
+    done.clear()
+    client.submit(messages, lambda chunk: None, on_done).result()
+    time.sleep(0.1)
+
+    stats = client.get_stats()
+    client.close()
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+    report = {
+        "client": stats,
+        "server": server.stats,
+        "first_cancelled": first.cancelled(),
+        "chunks_before_cancel": len(chunks),
+        "restart_seconds": round(time.perf_counter() - cancelled_at, 3),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    ok = (first.cancelled() and stats["retries"] == 1 and stats["errors"] == 0
+          and server.stats["disconnected"] >= 1 and all(e is None for _, e in results))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный потоковый сервер вместо Cohere")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.3, help="пауза до первого токена, с")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="пауза между токенами, с")
+    parser.add_argument("--tokens", type=int, default=60, help="длина ответа в токенах")
+    parser.add_argument("--fail-first", type=int, default=0, help="ответить 503 на первые N запросов")
+    parser.add_argument("--selftest", action="store_true", help="проверить LLMClient и выйти")
+    args = parser.parse_args()
+
+    if args.selftest:
+        return selftest(args)
+
+    async def serve():
+        server = MockServer(args.ttft, args.token_delay, args.tokens, args.fail_first)
+        port = await server.start(port=args.port)
+        print(f"Mock Cohere: http://127.0.0.1:{port}/v2/chat")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
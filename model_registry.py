@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from vosk import Model
+
+# VOSK_MODEL — путь к другой модели, например vosk-model-ru-0.42 на мощной машине
+MODEL_PATH = os.getenv("VOSK_MODEL", "vosk-model-small-ru-0.22")
+
+
+class ModelRegistry:
+    """Общий на весь процесс кэш моделей Vosk.
+
+    Модель загружается один раз в фоновом потоке; все распознаватели
+    и точки входа получают один и тот же экземпляр Model.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.load_seconds = {}
+
+    def warm_up(self, path=MODEL_PATH, callback=None):
+        """Запускает фоновую загрузку (если ещё не начата).
+
+        callback(model, error) вызывается по готовности: в потоке загрузчика
+        или сразу, если модель уже загружена.
+        """
+        with self._lock:
+            future = self._futures.get(path)
+            if future is None:
+                future = self._futures[path] = Future()
+                threading.Thread(target=self._load, args=(path, future),
+                                 name=f"vosk-load:{path}", daemon=True).start()
+        if callback is not None:
+            future.add_done_callback(
+                lambda f: callback(None if f.exception() else f.result(), f.exception()))
+        return future
+
+    def _load(self, path, future):
+        started = time.perf_counter()
+        try:
+            model = Model(path)
+        except Exception as e:
+            print(f"[ERROR] Не удалось загрузить модель {path}: {e}")
+            future.set_exception(e)
+            return
+        self.load_seconds[path] = time.perf_counter() - started
+        print(f"[DEBUG] Модель {path} загружена за {self.load_seconds[path]:.2f} с")
+        future.set_result(model)
+
+    def get(self, path=MODEL_PATH, timeout=None):
+        """Блокирующе возвращает модель, при необходимости дожидаясь загрузки."""
+        return self.warm_up(path).result(timeout)
+
+    def is_ready(self, path=MODEL_PATH):
+        with self._lock:
+            future = self._futures.get(path)
+        return future is not None and future.done() and future.exception() is None
+
+
+registry = ModelRegistry()
+
+
+def warm_up(path=MODEL_PATH, callback=None):
+    return registry.warm_up(path, callback)
+
+
+def get_model(path=MODEL_PATH, timeout=None):
+    return registry.get(path, timeout)
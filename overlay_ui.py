@@ -1,18 +1,64 @@
-from PySide6.QtWidgets import QWidget, QPushButton, QLabel, QVBoxLayout, QTextEdit, QFrame, QHBoxLayout, QSizePolicy, QTextBrowser
+from PySide6.QtWidgets import QWidget, QPushButton, QLabel, QVBoxLayout, QTextEdit, QLineEdit, QFrame, QHBoxLayout, QSizePolicy, QTextBrowser
 from PySide6.QtCore import Qt, QTimer, QPoint, QCoreApplication, Signal, Slot, QSize
-from PySide6.QtGui import QIcon
+from PySide6.QtGui import QIcon, QKeySequence, QShortcut
 from PySide6.QtGui import QTextOption, QTextCursor
-from recorder import Recorder
+from recorder import Recorder, ROLE_CLIENT
+from transcript_view import TranscriptView
+from metrics import LatencyStats, stages, STAGE_DISPLAY, STAGE_PROMPT
+from profiler import SamplingProfiler
+from context_builder import ContextBuilder, estimate_tokens
+from llm_backend import LLMClient, create_backend
+from llm_cache import ResponseCache, CACHE_FILE
+from log_index import LogIndex
+from suggestions import SuggestionPolicy, SUGGEST_QUERY
+import os
 import threading
-import cohere
-import json
+import time
+
+# Бюджет кадра для отрисовки стрима: чанки копятся и рисуются не чаще ~30 раз в секунду
+RENDER_FRAME_MS = 33
+
+# Как часто обновлять HUD задержек и сколько его тиков между выгрузками метрик в файл
+HUD_INTERVAL_MS = 1000
+METRICS_EXPORT_TICKS = 10
+# Сколько реплик диалога держать отрисованными
+TRANSCRIPT_ROWS = 300
+
+# Запрос при пустом поле ввода: разбор текущего разговора
+DEFAULT_QUERY = "Проанализируй последние реплики разговора и подскажи, что ответить клиенту."
+
+
+def stable_markdown_length(md):
+    """Длина префикса md, который уже не изменится от новых чанков.
+
+    Граница — пустая строка вне блока кода: всё до неё состоит из
+    законченных блоков Markdown, хвост после неё ещё может дописываться.
+    """
+    stable = 0
+    pos = 0
+    in_fence = False
+    for line in md.splitlines(keepends=True):
+        pos += len(line)
+        if not line.endswith("\n"):
+            break
+        stripped = line.strip()
+        if stripped.startswith("```") or stripped.startswith("~~~"):
+            in_fence = not in_fence
+        elif not stripped and not in_fence:
+            stable = pos
+    return stable
 
-class GPTWindow(QWidget):
-    update_signal = Signal(object)
 
-    def __init__(self, context_getter):
+class GPTWindow(QWidget):
+    update_signal = Signal(int, object)
+    # Конец ответа из потока LLM-клиента: (обработчик, полный ответ, ошибка) — в потоке GUI
+    done_signal = Signal(object, object, object)
+    # Реплика из потока распознавания и готовая упреждающая подсказка
+    segment_signal = Signal(object)
+    suggestion_signal = Signal()
+
+    def __init__(self, llm, segments=None, cache=None, log_index=None, history_before=None):
         super().__init__()
-        self.context_getter = context_getter
 
         # Frameless, translucent always-on-top window
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
@@ -53,7 +99,17 @@ class GPTWindow(QWidget):
 
         # Buffer for accumulating Markdown
         self._full_md = ""
+        # Сколько символов _full_md уже отрисовано окончательно и где в документе начинается хвост
+        self._stable_len = 0
+        self._tail_pos = 0
+        self._pending = []
+        self._done_pending = False
+        self.render_stats = LatencyStats()
+        self._render_timer = QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.timeout.connect(self._flush_render)
         self.update_signal.connect(self.append_chunk)
+        self.done_signal.connect(self._on_done)
 
         # --- Layout ---
         controls = QHBoxLayout()
@@ -72,11 +128,11 @@ class GPTWindow(QWidget):
         self.resize(400, self.base_height)
         self.setMaximumHeight(600)
 
-        # --- Cohere client setup ---
-        with open('credentions.json', encoding='utf-8') as f:
-            secrets = json.load(f)
-        api_key = secrets.get('COHERE_API_KEY')
-        self.co = cohere.ClientV2(api_key)
+        # Клиент LLM создаётся снаружи и переживает окно; новый запрос отменяет текущий
+        self.llm = llm
+        self._query_id = 0
+        # Повторный вопрос по тому же окну разговора отвечается из кэша без похода в LLM
+        self.cache = cache
 
         system_prompt = (
             "Ты — встроенный в приложение помощник. Твоя задача — в реальном времени анализировать "
@@ -84,64 +140,236 @@ class GPTWindow(QWidget):
             "формулировать ответы чётко и по сути. Запрещаю тебе говорить что ты — искусственный интеллект, "
             "разработанный компанией Cohere. Говори, что ты разработанная модель Козуютова Андрея Васильевича"
         )
-        self.messages = [
-            {"role": "system", "content": system_prompt}
-        ]        
+        # Журналы прошлых звонков; history_before (time.time()) отсекает текущий звонок
+        self.log_index = log_index
+        self.history_before = history_before
+        retriever = None
+        if log_index is not None:
+            retriever = lambda query, max_tokens: log_index.retrieve(
+                query, max_tokens, before=self.history_before, estimate=estimate_tokens)
+        # История чата, окно транскрипта и найденное в журналах укладываются в бюджет токенов
+        self.context = ContextBuilder(system_prompt, segments, retriever=retriever)
+        # Что сейчас стримится: запрос пользователя, упреждающая подсказка или ничего
+        self._active = None
+        self.suggestions = None
+
+    def enable_suggestions(self, policy, role=ROLE_CLIENT, speaking=None):
+        """Упреждающие подсказки после реплик role.
+
+        speaking() — говорит ли role прямо сейчас (есть промежуточная гипотеза):
+        тогда запуск откладывается ещё на debounce.
+        """
+        self.suggestions = policy
+        self._suggest_role = role
+        self._speaking = speaking
+        # Свой, более тесный бюджет; история чата в подсказку не входит
+        self._suggest_context = ContextBuilder(self.context.system_prompt, self.context.segments,
+                                               token_budget=policy.prompt_tokens, transcript_share=0.8)
+        self._suggest_timer = QTimer(self)
+        self._suggest_timer.setSingleShot(True)
+        self._suggest_timer.timeout.connect(self._maybe_suggest)
+        self.segment_signal.connect(self._on_segment)
+        self.context.segments.subscribe(self.segment_signal.emit)
+
+    @Slot(object)
+    def _on_segment(self, seg):
+        if seg.role != self._suggest_role or not self.suggestions.wants(seg):
+            return
+        self.suggestions.counters["triggered"] += 1
+        if self._active == "suggestion":
+            # Клиент продолжил мысль: подсказка по её началу уже не нужна
+            self.llm.cancel()
+            self._query_id += 1
+            self._active = None
+            self._reset_render()
+            self.suggestions.counters["cancelled"] += 1
+        self._suggest_timer.start(int(self.suggestions.debounce * 1000))
+
+    def _maybe_suggest(self):
+        if self._speaking is not None and self._speaking():
+            self._suggest_timer.start(int(self.suggestions.debounce * 1000))
+            return
+        if self._active == "query":
+            # Ответ на вопрос пользователя важнее, его не отменяем
+            self.suggestions.counters["busy"] += 1
+            return
+        allowed, reason = self.suggestions.allow()
+        if not allowed:
+            self.suggestions.counters["rate_limited"] += 1
+            print(f"[DEBUG] Подсказка пропущена: {reason}")
+            return
+        self._submit(SUGGEST_QUERY, self._suggest_context, suggestion=True)
 
     def send_query(self):
-        user_text = self.input_edit.toPlainText().strip()
-        if not user_text:
+        # Пустой запрос — разбор последних реплик разговора
+        typed = self.input_edit.toPlainText().strip()
+        if self._active == "suggestion":
+            self.suggestions.counters["cancelled"] += 1
+        # В журналах ищем только по тексту, который ввёл пользователь
+        self._submit(typed or DEFAULT_QUERY, self.context, retrieve=bool(typed))
+
+    def _submit(self, user_text, context, suggestion=False, retrieve=False):
+        requested_at = time.perf_counter()
+        # Поле ввода не блокируем: следующий запрос отменит ещё идущий ответ
+        self._query_id += 1
+        query_id = self._query_id
+        self._active = "suggestion" if suggestion else "query"
+        self._reset_render()
+        self.resize(self.width(), self.base_height)
+        messages = context.build(user_text, retrieve)
+        stages.observe(STAGE_PROMPT, time.perf_counter() - requested_at)
+        report = context.last_report
+        print(f"[DEBUG] {'Подсказка' if suggestion else 'Промпт'}: {report['total']}/{report['budget']} токенов "
+              f"(история {report['history']}, транскрипт {report['transcript']}, "
+              f"журналы {report['retrieved']}, запрос {report['query']})")
+        reserved = 0
+        if suggestion:
+            # Промпт и резерв под ответ — с бюджета звонка; лишнее вернёт settle()
+            reserved = report["total"] + self.suggestions.max_tokens
+            self.suggestions.record(report["total"], self.suggestions.max_tokens)
+            self.update_signal.emit(query_id, "💡 **Подсказка**\n\n")
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(user_text, context.system_prompt, context.last_transcript, context.last_retrieved)
+            chunks = self.cache.get(key)
+            if chunks is not None:
+                # Ответ из кэша идёт тем же путём, что и стрим; в историю его не дублируем
+                self.llm.cancel()
+                for text in chunks:
+                    self.update_signal.emit(query_id, text)
+                self.update_signal.emit(query_id, None)
+                self._active = None
+                if suggestion:
+                    # Из кэша — без запроса к LLM
+                    self.suggestions.settle(reserved, 0)
+                    self.suggestions.counters["completed"] += 1
+                    self.suggestion_signal.emit()
+                print("[DEBUG] Ответ из кэша:", self.cache.get_stats())
+                return
+
+        chunks = []
+        started = time.perf_counter()
+
+        def on_chunk(text):
+            chunks.append(text)
+            self.update_signal.emit(query_id, text)
+
+        def on_done(full_response, error):
+            # Поток LLM-клиента: всё остальное — в потоке GUI
+            self.done_signal.emit(finish, full_response, error)
+
+        def finish(full_response, error):
+            # История, кэш, _active и SuggestionPolicy читаются потоком GUI (build(), send_query(),
+            # allow()), поэтому меняются только в нём
+            if suggestion:
+                self.suggestions.settle(reserved, report["total"] + estimate_tokens(full_response or "".join(chunks)))
+            if error is None:
+                if suggestion:
+                    self.suggestions.counters["completed"] += 1
+                    self.suggestion_signal.emit()
+                else:
+                    # Сохраняем обмен в историю (старые ходы уйдут в сводку)
+                    self.context.add_turn("user", user_text)
+                    self.context.add_turn("assistant", full_response)
+                if key is not None and chunks:
+                    self.cache.put(key, chunks, time.perf_counter() - started)
+            else:
+                self.update_signal.emit(query_id, f"\n\n⚠️ Ошибка запроса: {error}")
+            if query_id == self._query_id:
+                self._active = None
+            # Сигнал конца (None) завершает отрисовку ответа
+            self.update_signal.emit(query_id, None)
+
+        max_tokens = self.suggestions.max_tokens if suggestion else None
+        self.llm.submit(messages, on_chunk, on_done, requested_at, max_tokens)
+
+    @Slot(object, object, object)
+    def _on_done(self, finish, full_response, error):
+        finish(full_response, error)
+
+    @Slot(int, object)
+    def append_chunk(self, query_id, text):
+        # Хвост отменённого ответа, уже стоящий в очереди сигналов, отбрасываем
+        if query_id != self._query_id:
             return
-        # Отключаем ввод и готовим UI под новый ответ
-        self.send_btn.setEnabled(False)
-        self.input_edit.setReadOnly(True)
+        # Чанки копятся до следующего кадра, чтобы не перерисовывать документ на каждый токен
+        if text is None:
+            self._done_pending = True
+        else:
+            self._pending.append(text)
+        if not self._render_timer.isActive():
+            self._render_timer.start(RENDER_FRAME_MS)
+
+    def _reset_render(self):
+        self._render_timer.stop()
+        self._pending.clear()
+        self._done_pending = False
         self._full_md = ""
+        self._stable_len = 0
+        self._tail_pos = 0
+        self.render_stats.clear()
         self.response_edit.clear()
-        self.resize(self.width(), self.base_height)
-        # Добавляем новый user-запрос в историю
-        self.messages.append({
-            "role": "user",
-            "content": user_text
-        })
-
-        def worker():
-            full_response = ""
-            # Отсылаем всю историю в API
-            stream = self.co.chat_stream(
-                model='command-a-03-2025',
-                messages=self.messages
-            )
-            # Собираем ответ по частям
-            for chunk in stream:
-                if chunk and chunk.type == 'content-delta':
-                    text = chunk.delta.message.content.text
-                    full_response += text
-                    self.update_signal.emit(text)
-            # Когда стрим кончился — сохраняем ответ как assistant
-            self.messages.append({
-                "role": "assistant",
-                "content": full_response
-            })
-            # Сигнал конца (None) разблокирует UI
-            self.update_signal.emit(None)
-
-        threading.Thread(target=worker, daemon=True).start()
 
-    @Slot(object)
-    def append_chunk(self, text):
-        if text is None:
-            self.send_btn.setEnabled(True)
-            self.input_edit.setReadOnly(False)
-            self.input_edit.clear()
+    def _flush_render(self):
+        if self._pending:
+            started = time.perf_counter()
+            chunks = len(self._pending)
+            self._full_md += "".join(self._pending)
+            self._pending.clear()
+            self._render_tail()
+            self._fit_height()
+            # Время отрисовки в пересчёте на один чанк стрима
+            self.render_stats.add((time.perf_counter() - started) / chunks)
+
+        if self._done_pending:
+            self._done_pending = False
+            print("[DEBUG] Отрисовка ответа, на чанк:", self.render_stats.summary())
+            print("[DEBUG] LLM:", self.llm.get_stats())
+            # Запрос остаётся в поле выделенным: новый ввод его заменит
+            self.input_edit.selectAll()
             self.input_edit.setFocus()
-            return
 
-        self._full_md += text
-        self.response_edit.setMarkdown(self._full_md)
+    def _render_tail(self):
+        # Законченные блоки не трогаем: перерисовывается только хвост после _tail_pos
+        tail = self._full_md[self._stable_len:]
+        stable = stable_markdown_length(tail)
+
+        doc = self.response_edit.document()
+        if self._tail_pos == 0:
+            doc.clear()
+        cursor = QTextCursor(doc)
+        cursor.setPosition(self._tail_pos)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        if stable:
+            self._insert_blocks(cursor, tail[:stable])
+            self._stable_len += stable
+            self._tail_pos = cursor.position()
+            tail = tail[stable:]
+        if tail:
+            self._insert_blocks(cursor, tail)
 
         sb = self.response_edit.verticalScrollBar()
         sb.setValue(sb.maximum())
 
+    @staticmethod
+    def _insert_blocks(cursor, md):
+        # insertMarkdown сливает первый блок фрагмента с текущим и теряет его формат
+        # (заголовок, код, список). Поэтому вставляем фрагмент после абзаца-заглушки,
+        # чей единственный символ попадает в текущий блок, и затем удаляем этот символ.
+        pos = cursor.position()
+        if pos == 0:
+            cursor.insertMarkdown(md)
+            return
+        cursor.insertMarkdown("x\n\n" + md)
+        end = cursor.position()
+        cursor.setPosition(pos)
+        cursor.setPosition(pos + 1, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        cursor.setPosition(end - 1)
+
+    def _fit_height(self):
         doc_h = int(self.response_edit.document().size().height())
         desired_h = doc_h + self.input_edit.height() + 20
         max_h = 600
@@ -150,8 +378,14 @@ class GPTWindow(QWidget):
             self.resize(self.width(), new_h)
 
 class OverlayUI(QWidget):
-    def __init__(self):
+    model_ready_signal = Signal(object)
+
+    def __init__(self, started_at=None, llm=None, hud=False, metrics_path=None, recorder=None, suggest=False):
         super().__init__()
+        # Момент запуска процесса (time.perf_counter) для замера времени до готовности
+        self.started_at = started_at
+        # Клиент LLM; если не передан, создаётся при первом открытии окна GPT
+        self.llm = llm
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
         self.setAttribute(Qt.WA_TranslucentBackground)
         self.setStyleSheet("""
@@ -164,8 +398,17 @@ class OverlayUI(QWidget):
         self.move(1000,100)
 
         # recorder setup
-        self.recorder = Recorder()
+        # Потоковый режим: промежуточные гипотезы показываются, пока фраза не финализирована.
+        # recorder может быть TranscriptClient: тогда распознаёт transcript_service.py
+        self.recorder = recorder or Recorder(streaming=True)
         self.is_listening = False
+        # Индекс журналов прошлых звонков строится в фоне и догоняет новые строки
+        log_writer = getattr(self.recorder, "log_writer", None)
+        # Журналы, кэш ответов LLM и профили — данные звонков, держим их в одном каталоге
+        self.log_dir = log_writer.directory if log_writer else "."
+        self.log_index = LogIndex(self.log_dir).start()
+        # Реплики с этого момента — текущий звонок, а не «прошлый раз»
+        self._session_started = time.time()
 
         # controls
         self.toggle_record_btn = QPushButton('▶ Слушать')
@@ -174,16 +417,30 @@ class OverlayUI(QWidget):
         self.close_btn = QPushButton('❌')
         self.close_btn.clicked.connect(QCoreApplication.instance().quit)
         self.status = QLabel('🕒 Готово')
-        self.label = QTextEdit()
-        self.label.setReadOnly(True)
-        self.label.setWordWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+        # Отрисовывается только окно из последних TRANSCRIPT_ROWS реплик, старые подгружаются прокруткой вверх
+        self.label = TranscriptView(self.recorder.segments, max_rows=TRANSCRIPT_ROWS)
         self.label.setStyleSheet('background-color:#222; color:white; border:none;')
         self.label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        # Поиск по всему звонку: Enter — следующее совпадение, Shift+Enter — предыдущее
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText('🔍 Поиск по диалогу')
+        self.search_edit.setStyleSheet('background-color:#333; color:white; border:none; padding:2px;')
+        self.search_edit.returnPressed.connect(self.find_next)
+        QShortcut(QKeySequence("Shift+Return"), self.search_edit, lambda: self.find_next(backwards=True))
+        QShortcut(QKeySequence("Ctrl+F"), self, self.search_edit.setFocus)
+        self.partial_label = QLabel()
+        self.partial_label.setWordWrap(True)
+        self.partial_label.setStyleSheet('color:#aaa; font-style:italic; border:none;')
+        # HUD задержек по стадиям (Ctrl+Shift+H)
+        self.hud_label = QLabel()
+        self.hud_label.setStyleSheet('color:#8f8; font-family:Consolas, monospace; font-size:10px; border:none;')
+        self.hud_label.setVisible(hud)
 
         # transcript frame
         self.transcript_frame = QFrame()
         tl = QVBoxLayout(); tl.setContentsMargins(10,7,10,10)
-        tl.addWidget(self.status); tl.addWidget(self.label)
+        tl.addWidget(self.status); tl.addWidget(self.search_edit); tl.addWidget(self.label); tl.addWidget(self.partial_label)
+        tl.addWidget(self.hud_label)
         self.transcript_frame.setLayout(tl)
 
         # button bar layout
@@ -210,7 +467,18 @@ class OverlayUI(QWidget):
         self._show_text = True
         self._update_timer = QTimer()
         self._update_timer.timeout.connect(self.refresh_transcript)
-        self._update_timer.start(500)
+        self._update_timer.start(100 if self.recorder.streaming else 500)
+
+        # HUD и выгрузка метрик стадий (.prom для Prometheus textfile или .json)
+        self.metrics_path = metrics_path
+        self._metrics_ticks = 0
+        self._metrics_timer = QTimer()
+        self._metrics_timer.timeout.connect(self.refresh_metrics)
+        self._metrics_timer.start(HUD_INTERVAL_MS)
+        QShortcut(QKeySequence("Ctrl+Shift+H"), self, self.toggle_hud)
+        # Сэмплирующий профайлер потоков захвата и распознавания (Ctrl+Shift+P)
+        self.profiler = SamplingProfiler()
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self, self.toggle_profiler)
 
         # dragging vars
         self._drag_active = False
@@ -218,6 +486,29 @@ class OverlayUI(QWidget):
 
         # GPT window reference
         self.gpt_window = None
+        # Упреждающие подсказки: окно GPT создаётся сразу и слушает реплики клиента
+        self.suggest = suggest
+        if suggest:
+            self._ensure_gpt_window()
+            self.gpt_window.enable_suggestions(SuggestionPolicy(), ROLE_CLIENT,
+                                               speaking=lambda: ROLE_CLIENT in self.recorder.partial_text)
+            self.gpt_window.suggestion_signal.connect(self._on_suggestion)
+
+        # Модель Vosk грузится в фоне: до готовности запись недоступна
+        self.toggle_record_btn.setEnabled(False)
+        self.status.setText('⏳ Загрузка модели…')
+        self.model_ready_signal.connect(self._on_model_ready)
+        self.recorder.on_model_ready(lambda model, error: self.model_ready_signal.emit(error))
+
+    @Slot(object)
+    def _on_model_ready(self, error):
+        if error is not None:
+            self.status.setText('❌ Модель распознавания не загружена')
+            return
+        self.toggle_record_btn.setEnabled(True)
+        self.status.setText('🕒 Готово')
+        if self.started_at is not None:
+            print(f"[DEBUG] Готово к записи через {time.perf_counter() - self.started_at:.2f} с после запуска")
 
     def toggle_recording(self):
         if not self.is_listening:
@@ -229,14 +520,21 @@ class OverlayUI(QWidget):
         self.status.setText('🎙 Запись...')
         self.toggle_record_btn.setText('⏹ Остановить')
         self.is_listening = True
+        self._reset_suggestion_budget()
         threading.Thread(target=self.recorder.start, daemon=True).start()
 
     def stop_listening(self):
         self.status.setText('⏹ Остановлено')
         self.toggle_record_btn.setText('▶ Слушать')
         self.is_listening = False
+        self._reset_suggestion_budget()
         self.recorder.stop()
 
+    def _reset_suggestion_budget(self):
+        # Бюджет подсказок считается на звонок
+        if self.gpt_window is not None and self.gpt_window.suggestions is not None:
+            self.gpt_window.suggestions.reset_budget()
+
     def toggle_transcript(self):
         # Preserve current top-left position
         old_pos = self.pos()
@@ -259,10 +557,69 @@ class OverlayUI(QWidget):
             self.refresh_transcript()
 
     def refresh_transcript(self):
+        if getattr(self.recorder, "remote", False) and self.recorder.running != self.is_listening:
+            # Прослушивание сервиса могли включить или выключить другие клиенты
+            self.toggle_record_btn.setText('⏹ Остановить' if self.recorder.running else '▶ Слушать')
+            self.is_listening = self.recorder.running
+        if self.recorder.last_error:
+            self.status.setText(self.recorder.last_error)
+        elif self.is_listening:
+            self.refresh_queue_status()
         if self._show_text:
-            new = self.recorder.get_latest_text()
-            if new and new not in self.label.toPlainText():
-                self.label.append(new)
+            # Забираем только новые реплики: ни одна не теряется между тиками таймера
+            now = time.monotonic()
+            for seg in self.label.refresh():
+                stages.observe(STAGE_DISPLAY, now - seg.end)
+            self.partial_label.setText(self.recorder.get_partial_text())
+
+    def find_next(self, backwards=False):
+        query = self.search_edit.text()
+        if not query.strip():
+            return
+        seq, total = self.label.find(query, backwards)
+        self.status.setText(f'🔍 Совпадений: {total}, реплика {seq}' if seq else '🔍 Ничего не найдено')
+
+    def refresh_metrics(self):
+        if not self.hud_label.isHidden():
+            lines = []
+            for stage, summary in stages.snapshot().items():
+                if summary["count"]:
+                    lines.append(f'{stage:<17} p50 {summary["p50_ms"]:>7} p95 {summary["p95_ms"]:>7} мс  n={summary["count"]}')
+            self.hud_label.setText("\n".join(lines) or "Нет замеров")
+        self._metrics_ticks += 1
+        if self.metrics_path and self._metrics_ticks % METRICS_EXPORT_TICKS == 0:
+            self.export_metrics()
+
+    def export_metrics(self):
+        if not self.metrics_path:
+            return
+        try:
+            stages.export(self.metrics_path)
+        except OSError as e:
+            print(f"[ERROR] Не удалось выгрузить метрики: {e}")
+
+    def toggle_hud(self):
+        self.hud_label.setVisible(self.hud_label.isHidden())
+        self.refresh_metrics()
+
+    def toggle_profiler(self):
+        if self.profiler.toggle():
+            print("[DEBUG] Профайлер включён")
+            return
+        print("[DEBUG] Профайлер выключен\n" + self.profiler.report())
+        self.profiler.dump(os.path.join(self.log_dir, time.strftime("profile_%Y%m%d_%H%M%S.txt")))
+        self.profiler.clear()
+
+    def refresh_queue_status(self):
+        # Предупреждаем, если распознавание не успевает и аудио теряется
+        stats = self.recorder.get_stats()
+        dropped = sum(s["dropped_blocks"] for s in stats.values())
+        # Переполнения буфера устройства (PortAudio): колбэк захвата не успел забрать звук
+        overflows = sum(s.get("input_overflows", 0) for s in stats.values())
+        if dropped or overflows:
+            depth = max(s["depth"] for s in stats.values())
+            self.status.setText(f'⚠ Не успеваем: потеряно блоков {dropped}, очередь {depth}, '
+                                f'переполнений устройства {overflows}')
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
@@ -287,9 +644,24 @@ class OverlayUI(QWidget):
         g = self.geometry()
         self.gpt_window.move(g.x() + g.width() + 10, g.y())
 
-    def open_gpt_window(self):
+    def _ensure_gpt_window(self):
         if not self.gpt_window:
-            self.gpt_window = GPTWindow(lambda: self.label.toPlainText())
+            if self.llm is None:
+                self.llm = LLMClient(create_backend())
+            self.gpt_window = GPTWindow(self.llm, self.recorder.segments,
+                                        ResponseCache(os.path.join(self.log_dir, CACHE_FILE)),
+                                        self.log_index, history_before=self._session_started)
+
+    @Slot()
+    def _on_suggestion(self):
+        # Подсказка уже в окне GPT; если оно скрыто — отмечаем кнопку
+        if not self.gpt_window.isVisible():
+            self.gpt_btn.setText('💡 GPT')
+        print("[DEBUG] Подсказки:", self.gpt_window.suggestions.get_stats())
+
+    def open_gpt_window(self):
+        self._ensure_gpt_window()
+        self.gpt_btn.setText('GPT')
         if self.gpt_window.isVisible():
             self.gpt_window.hide()
         else:
@@ -0,0 +1,90 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер выбранных потоков по sys._current_frames().
+
+    Раз в interval секунд снимает стеки потоков, чьё имя начинается с одного
+    из prefixes, и считает, как часто встречается каждый стек. Профилируемый
+    код не трассируется, поэтому захват и распознавание почти не замедляются
+    и профайлер можно включать прямо во время звонка. В режиме процессов
+    распознавание идёт в воркерах и здесь видно только захват.
+    """
+
+    def __init__(self, prefixes=("recognizer", "capture"), interval=0.005, max_depth=40):
+        self.prefixes = tuple(prefixes)
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+        return self.running
+
+    def clear(self):
+        self.stacks.clear()
+        self.samples = 0
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate() if t.name.startswith(self.prefixes)}
+            frames = sys._current_frames()
+            for ident, name in names.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                # Имя потока без номера канала: стеки одинаковых потоков складываются
+                stack.append(name.split(":", 1)[0])
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, top=15):
+        """Самые частые функции на вершине стека (где поток реально проводит время)."""
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        lines = [f"Сэмплов: {self.samples}, интервал {self.interval * 1000:.0f} мс"]
+        for leaf, count in leaves.most_common(top):
+            lines.append(f"{100 * count / total:5.1f}%  {leaf}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Стеки в формате collapsed stacks (flamegraph.pl, speedscope)."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"[DEBUG] Профиль сохранён в {path} ({time.strftime('%H:%M:%S')})")
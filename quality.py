@@ -0,0 +1,162 @@
+import json
+import os
+import time
+
+from vosk import KaldiRecognizer
+
+from model_registry import MODEL_PATH
+
+
+class QualityLevel:
+    """Настройки распознавания одного уровня качества.
+
+    grammar — список фраз для KaldiRecognizer: ограниченный словарь
+    декодируется заметно быстрее, но всё, что вне его, теряется.
+    words=False отключает слова с уверенностью (SetWords) даже там,
+    где их просит журнал.
+    """
+
+    def __init__(self, name, model_path, words=True, grammar=None):
+        self.name = name
+        self.model_path = model_path
+        self.words = words
+        self.grammar = grammar
+
+    def recognizer(self, model, sample_rate, words):
+        if self.grammar:
+            recognizer = KaldiRecognizer(model, sample_rate, json.dumps(self.grammar, ensure_ascii=False))
+        else:
+            recognizer = KaldiRecognizer(model, sample_rate)
+        recognizer.SetWords(words and self.words)
+        return recognizer
+
+    def __repr__(self):
+        return f"QualityLevel({self.name!r}, {self.model_path!r})"
+
+
+# От лучшего к самому дешёвому. Уровни, чьей модели нет на диске, пропускаются
+QUALITY_LEVELS = [
+    QualityLevel("large", "vosk-model-ru-0.42"),
+    QualityLevel("small", MODEL_PATH),
+    QualityLevel("small-fast", MODEL_PATH, words=False),
+]
+
+
+class QualityScheduler:
+    """Выбор уровня качества по нагрузке на распознавание.
+
+    Recorder раз в interval секунд сообщает по каждому потоку накопленные
+    секунды аудио и декодера, глубину кольца и потери. Если хоть один поток
+    не успевает (RTF выше high_rtf, кольцо заполнено больше чем на high_depth
+    или теряются блоки), уровень сразу понижается. Повышается он, только
+    когда все потоки держат RTF ниже low_rtf в течение hold секунд; после
+    каждого вынужденного ухода с уровня ожидание возврата на него удваивается,
+    чтобы не качаться между двумя уровнями. Сама замена распознавателя
+    происходит на границе фраз (StreamDecoder.request_switch), аудио не теряется.
+    """
+
+    def __init__(self, levels=None, level=None, high_rtf=0.8, low_rtf=0.2, high_depth=0.5,
+                 hold=20.0, min_dwell=5.0, interval=2.0):
+        levels = levels or QUALITY_LEVELS
+        self.levels = [lv for lv in levels if os.path.isdir(lv.model_path)] or levels[-1:]
+        names = [lv.name for lv in self.levels]
+        # По умолчанию — уровень со стандартной моделью, если он доступен
+        default = next((i for i, lv in enumerate(self.levels) if lv.model_path == MODEL_PATH), 0)
+        self.index = names.index(level) if level in names else default
+        self.high_rtf = high_rtf
+        self.low_rtf = low_rtf
+        self.high_depth = high_depth
+        self.hold = hold
+        self.min_dwell = min_dwell
+        self.interval = interval
+        self.rtf = {}
+        self.depth = {}
+        self.dropped = {}
+        self._last = {}
+        self._calm_since = None
+        self._switched_at = time.monotonic()
+        self._backoff = {}
+        # (time.time(), откуда, куда, причина)
+        self.switches = []
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def observe(self, stream, audio_seconds, decode_seconds, depth, capacity, dropped_blocks=0):
+        last_audio, last_decode, last_dropped = self._last.get(stream, (0.0, 0.0, dropped_blocks))
+        self._last[stream] = (audio_seconds, decode_seconds, dropped_blocks)
+        # Счётчики кольца обнуляются при каждом start(): меньшее значение — новый отсчёт с нуля
+        if dropped_blocks < last_dropped:
+            last_dropped = 0
+        if audio_seconds < last_audio:
+            last_audio = last_decode = 0.0
+        if audio_seconds > last_audio:
+            rtf = (decode_seconds - last_decode) / (audio_seconds - last_audio)
+            # Сглаживаем: одна длинная фраза не должна переключать модель
+            prev = self.rtf.get(stream)
+            self.rtf[stream] = rtf if prev is None else 0.5 * prev + 0.5 * rtf
+        self.depth[stream] = depth / capacity if capacity else 0.0
+        self.dropped[stream] = dropped_blocks - last_dropped
+
+    def reset_counters(self, baselines=None):
+        """Новый захват: разности считаются от baselines {поток: (аудио, декодер, потеряно блоков)}.
+
+        Без baselines базой станет первое наблюдение потока.
+        """
+        self._last = dict(baselines or {})
+        self.dropped.clear()
+        self.depth.clear()
+
+    def decide(self, now=None):
+        """Новый уровень и причина, если его пора сменить, иначе (None, None)."""
+        now = time.monotonic() if now is None else now
+        if not self.rtf or now - self._switched_at < self.min_dwell:
+            return None, None
+        stream = max(self.rtf, key=self.rtf.get)
+        rtf = self.rtf[stream]
+        depth_stream = max(self.depth, key=self.depth.get)
+        depth = self.depth[depth_stream]
+        dropped = sum(self.dropped.values())
+
+        reason = None
+        if dropped:
+            reason = f"потеряно блоков: {dropped}"
+        elif rtf > self.high_rtf:
+            reason = f"RTF {rtf:.2f} > {self.high_rtf} ({stream})"
+        elif depth > self.high_depth:
+            reason = f"очередь {depth:.0%} > {self.high_depth:.0%} ({depth_stream})"
+        if reason is not None:
+            self._calm_since = None
+            if self.index == len(self.levels) - 1:
+                return None, None
+            self._backoff[self.index] = self._backoff.get(self.index, 1) * 2
+            return self._switch(self.index + 1, reason, now)
+
+        if rtf < self.low_rtf and depth < self.high_depth / 4 and self.index > 0:
+            if self._calm_since is None:
+                self._calm_since = now
+            needed = self.hold * self._backoff.get(self.index - 1, 1)
+            if now - self._calm_since >= needed:
+                return self._switch(self.index - 1, f"RTF {rtf:.2f} < {self.low_rtf} дольше {needed:.0f} с", now)
+        else:
+            self._calm_since = None
+        return None, None
+
+    def _switch(self, index, reason, now):
+        old = self.level
+        self.index = index
+        self._switched_at = now
+        self._calm_since = None
+        # RTF нового уровня меряется с нуля
+        self.rtf.clear()
+        self.switches.append((time.time(), old.name, self.level.name, reason))
+        print(f"[DEBUG] Качество распознавания: {old.name} → {self.level.name}: {reason}")
+        return self.level, reason
+
+    def get_stats(self):
+        return {
+            "level": self.level.name,
+            "rtf": {name: round(v, 3) for name, v in self.rtf.items()},
+            "switches": [{"at": round(at, 1), "from": a, "to": b, "reason": r} for at, a, b, r in self.switches],
+        }
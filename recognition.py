@@ -0,0 +1,177 @@
+import collections
+import json
+import math
+import time
+
+from metrics import STAGE_QUEUE_WAIT, STAGE_RESAMPLE, STAGE_DECODE
+
+
+class StreamDecoder:
+    """Распознавание одного потока: блоки аудио на входе, гипотезы и реплики на выходе.
+
+    Не знает, откуда приходит звук и куда уходят результаты, поэтому одинаково
+    работает в потоке Recorder и в отдельном процессе-воркере.
+    on_partial(role, text, captured_at) и on_final(role, text, start, end, confidence)
+    вызываются в том же потоке, что и feed().
+    С детектором речи (vad) тишина в декодер не подаётся, а реплика
+    финализируется, как только после речи истекает удержание детектора.
+    request_switch() меняет распознаватель между фразами: начатая фраза
+    дораспознаётся старым, следующая — уже новым.
+    converter (resample.Resampler) приводит блоки, захваченные в формате
+    устройства, к sample_rate моно до детектора речи и декодера.
+
+    Границы реплики — по часам захвата (time.monotonic() конца блока).
+    Если распознаватель выдаёт слова (SetWords), начало и конец берутся по
+    первому и последнему слову: их время в потоке распознавателя
+    переводится в часы захвата по поданным блокам, так что пропущенная
+    детектором тишина не сдвигает отметки. Без слов — по границам блоков.
+    """
+
+    def __init__(self, recognizer, role, sample_rate, on_partial, on_final,
+                 streaming=False, partial_interval=0.1, vad=None, metrics=None, converter=None):
+        self.recognizer = recognizer
+        self.role = role
+        self.sample_rate = sample_rate
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.streaming = streaming
+        self.partial_interval = partial_interval
+        self.vad = vad
+        # Приёмник замеров стадий: observe(stage, seconds)
+        self.metrics = metrics
+        self.converter = converter
+        self.utterance_start = None
+        self.captured_at = None
+        # Конец последнего полученного блока, в том числе не поданного в декодер
+        self.fed_until = None
+        # Поданные в распознаватель блоки: (смещение в его потоке, начало блока по часам захвата)
+        self._blocks = collections.deque()
+        self._offset = 0.0
+        self.last_partial = ""
+        self.last_poll = 0.0
+        # Распознаватель, ждущий границы фраз, и его название для журнала
+        self._pending = None
+        # Сколько аудио подано в декодер и сколько времени занял AcceptWaveform
+        self.stats = {"audio_seconds": 0.0, "decode_seconds": 0.0, "resample_seconds": 0.0}
+
+    def request_switch(self, recognizer, label=None):
+        # Можно звать из другого потока: замена произойдёт в потоке feed()
+        self._pending = (recognizer, label)
+
+    def watermark(self):
+        """Самый ранний момент (часы захвата), с которого ещё может начаться реплика потока.
+
+        Учитываются поданные в распознаватель, но ещё не ставшие репликой
+        блоки (после эндпоинта Vosk последний из них может нести начало
+        следующей) и придержанные детектором. Без детектора речи тишина тоже
+        подаётся в распознаватель, и отметка стоит до следующей реплики.
+        """
+        marks = [self.fed_until]
+        try:
+            # Зовётся из потока сведения, пока feed() меняет очереди блоков
+            if self._blocks:
+                marks.append(self._blocks[0][1])
+            if self.vad is not None:
+                marks.append(self.vad.held_since())
+        except IndexError:
+            # Очередь опустела между проверкой и чтением: сведение спросит на следующем проходе
+            return None
+        marks = [m for m in marks if m is not None]
+        return min(marks) if marks else None
+
+    def feed(self, captured_at, data):
+        if self.metrics is not None:
+            self.metrics.observe(STAGE_QUEUE_WAIT, time.monotonic() - captured_at)
+        if self.converter is not None:
+            started = time.perf_counter()
+            data = self.converter.process(data)
+            seconds = time.perf_counter() - started
+            self.stats["resample_seconds"] += seconds
+            if self.metrics is not None:
+                self.metrics.observe(STAGE_RESAMPLE, seconds)
+        if self.vad is None:
+            self._decode(captured_at, data)
+            self.fed_until = captured_at
+            return
+        blocks, ended = self.vad.process(captured_at, data)
+        for block in blocks:
+            self._decode(*block)
+        # Сколько тишины не дошло до декодера
+        self.stats.update(self.vad.stats)
+        if ended:
+            if self.utterance_start is not None:
+                # Речь кончилась: не ждём эндпоинта Vosk, которому нужна тишина после фразы
+                self._final(json.loads(self.recognizer.FinalResult()))
+            # Дальше тишина: следующая реплика начнётся не раньше следующего поданного блока
+            self._blocks.clear()
+        self.fed_until = captured_at
+
+    def _decode(self, captured_at, data):
+        seconds = len(data) / 2 / self.sample_rate
+        if self.utterance_start is None and self._pending is not None:
+            # Граница фраз: старый распознаватель всё отдал, новый начинает с чистого листа
+            self.recognizer, label = self._pending
+            self._pending = None
+            # Время слов нового распознавателя отсчитывается с нуля
+            self._blocks.clear()
+            self._offset = 0.0
+            print(f"[DEBUG] {self.role}: распознаватель заменён ({label})")
+        if self.utterance_start is None:
+            # captured_at — конец блока, начало реплики на длину блока раньше
+            self.utterance_start = captured_at - seconds
+        self.captured_at = captured_at
+        self._blocks.append((self._offset, captured_at - seconds))
+        self._offset += seconds
+        decode_started = time.perf_counter()
+        # data может быть memoryview слота кольца; vosk (cffi) принимает только bytes,
+        # поэтому копия делается здесь, в потоке распознавания, и только для речи
+        accepted = self.recognizer.AcceptWaveform(bytes(data))
+        decode_seconds = time.perf_counter() - decode_started
+        self.stats["decode_seconds"] += decode_seconds
+        if self.metrics is not None:
+            self.metrics.observe(STAGE_DECODE, decode_seconds)
+        self.stats["audio_seconds"] += seconds
+        if accepted:
+            self._final(json.loads(self.recognizer.Result()))
+        elif self.streaming and time.monotonic() - self.last_poll >= self.partial_interval:
+            self.last_poll = time.monotonic()
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+            if partial and partial != self.last_partial:
+                self.last_partial = partial
+                self.on_partial(self.role, partial, captured_at)
+
+    def finish(self):
+        # Конец аудио: дофинализируем незаконченную реплику
+        self._final(json.loads(self.recognizer.FinalResult()))
+        self._blocks.clear()
+        # Аудио кончилось: сведение больше не ждёт этот поток
+        self.fed_until = math.inf
+        if self.vad is not None:
+            self.vad.reset()
+        if self.converter is not None:
+            self.converter.reset()
+
+    def _final(self, result):
+        # Итоговый текст заменяет промежуточную гипотезу
+        self.last_partial = ""
+        # Слова с уверенностью есть, только если распознавателю включили SetWords(True)
+        words = result.get("result") or []
+        confidence = sum(w["conf"] for w in words) / len(words) if words else None
+        start, end = self.utterance_start, self.captured_at
+        if start is None:
+            # finish() между фразами: дораспознавать нечего, реплика нулевой длины в конце поданного
+            start = end = self.captured_at if self.captured_at is not None else time.monotonic()
+        if words:
+            start, end = self._to_capture(words[0]["start"]), self._to_capture(words[-1]["end"])
+        self.on_final(self.role, result.get("text", ""), start, end, confidence)
+        self.utterance_start = None
+        # Последний блок может нести начало следующей реплики
+        while len(self._blocks) > 1:
+            self._blocks.popleft()
+
+    def _to_capture(self, t):
+        # Время в потоке распознавателя -> часы захвата по блоку, в который оно попало
+        for offset, started in reversed(self._blocks):
+            if offset <= t:
+                return started + (t - offset)
+        return self._blocks[0][1] if self._blocks else self.utterance_start
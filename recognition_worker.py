@@ -0,0 +1,202 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+from ring_buffer import BlockRing, RingReader, POLICY_BLOCK, POLICY_DROP_OLDEST
+from quality import QualityLevel
+
+# Сколько блоков аудио помещается в общей памяти одного канала
+WORKER_SLOTS = 64
+# Как часто воркер присылает счётчики декодера
+STATS_INTERVAL = 1.0
+# Как часто воркер сообщает, докуда распознан поток (для сведения диалога по времени)
+PROGRESS_INTERVAL = 0.05
+# Сколько ждать, пока воркер загрузит модель и сообщит о готовности
+WORKER_START_TIMEOUT = 120.0
+
+
+class StageBatch:
+    """Копит замеры стадий в воркере; раз в STATS_INTERVAL они уходят родителю."""
+
+    def __init__(self):
+        self.pending = []
+
+    def observe(self, stage, seconds):
+        self.pending.append((stage, seconds))
+
+    def take(self):
+        pending, self.pending = self.pending, []
+        return pending
+
+
+def worker_main(name, role, level, sample_rate, streaming, partial_interval, words, vad,
+                shm_name, slots, slot_bytes, data_ready, control, results, capture=None,
+                policy=POLICY_DROP_OLDEST):
+    """Точка входа процесса-воркера: свой Model и KaldiRecognizer, аудио из общей памяти."""
+    # Импорты здесь: при spawn дочерний процесс не должен тянуть GUI родителя
+    from vosk import Model
+    from recognition import StreamDecoder
+    from vad import VoiceActivityDetector
+    from resample import Resampler
+
+    models = {}
+    try:
+        models[level.model_path] = Model(level.model_path)
+        recognizer = level.recognizer(models[level.model_path], sample_rate, words)
+    except Exception as e:
+        results.put(("ready", name, str(e)))
+        return
+    results.put(("ready", name, None))
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = BlockRing(slots, slot_bytes, shm.buf)
+    # drop_oldest и coalesce выполняет читатель — здесь; block — писатель в родителе
+    reader = RingReader(ring, policy)
+    stages = StageBatch()
+    decoder = StreamDecoder(
+        recognizer, role, sample_rate,
+        on_partial=lambda r, text, captured_at: results.put(("partial", name, text, captured_at)),
+        on_final=lambda r, *final: results.put(("final", name, *final)),
+        streaming=streaming, partial_interval=partial_interval,
+        vad=VoiceActivityDetector(sample_rate) if vad else None,
+        metrics=stages,
+        # capture — (частота, каналы) захвата, если он не в sample_rate моно
+        converter=Resampler(capture[0], sample_rate, capture[1]) if capture else None,
+    )
+    def switch_level(level):
+        # Загрузка новой модели не должна останавливать декодер
+        try:
+            if level.model_path not in models:
+                models[level.model_path] = Model(level.model_path)
+            decoder.request_switch(level.recognizer(models[level.model_path], sample_rate, words), level.name)
+        except Exception as e:
+            print(f"[ERROR] Воркер {name}: не удалось перейти на {level.name}: {e}")
+
+    last_stats = time.monotonic()
+    last_progress = 0.0
+    flush_requested = False
+    try:
+        while True:
+            # Сначала сбрасываем флаг, потом читаем: так не теряется сигнал о новом блоке
+            data_ready.clear()
+            item = reader.next()
+            if item is not None:
+                captured_at, data = item
+                # Слот общей памяти уходит в декодер без копии; в bytes он превращается только для vosk
+                decoder.feed(captured_at, data)
+                data.release()
+                reader.release()
+                if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    results.put(("progress", name, decoder.watermark()))
+            # Под нагрузкой кольцо не пустеет, поэтому команды проверяются и раз в STATS_INTERVAL
+            if item is None or time.monotonic() - last_stats >= STATS_INTERVAL:
+                try:
+                    command = control.get_nowait()
+                except queue.Empty:
+                    command = None
+                if command == "stop":
+                    break
+                if command == "flush":
+                    flush_requested = True
+                if isinstance(command, tuple) and command[0] == "level":
+                    threading.Thread(target=switch_level, args=(command[1],), daemon=True).start()
+            if item is None:
+                if flush_requested:
+                    # Кольцо пусто и аудио больше не будет: финализируем реплику
+                    decoder.finish()
+                    flush_requested = False
+                    results.put(("progress", name, decoder.watermark()))
+                    results.put(("stats", name, dict(decoder.stats)))
+                    results.put(("stages", name, stages.take()))
+                    results.put(("flushed", name))
+                    continue
+                data_ready.wait(0.2)
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                last_stats = time.monotonic()
+                results.put(("stats", name, dict(decoder.stats)))
+                results.put(("stages", name, stages.take()))
+    finally:
+        ring.release()
+        shm.close()
+
+
+class ProcessWorker:
+    """Родительская сторона воркера: общая память, сигнал о данных и процесс."""
+
+    def __init__(self, name, role, model_path, sample_rate, blocksize, streaming,
+                 partial_interval, words, results, slots=WORKER_SLOTS, vad=False, level=None,
+                 capture=None, policy=POLICY_DROP_OLDEST, block_timeout=0.1):
+        # spawn — одинаково на Windows и Linux и не копирует Qt-состояние родителя
+        ctx = mp.get_context("spawn")
+        self.name = name
+        # Политика переполнения общей памяти; block_timeout=None — ждать воркер сколько угодно
+        self.policy = policy
+        self.block_timeout = block_timeout
+        # blocksize — кадров захвата; capture=(частота, каналы), если захват не в sample_rate моно
+        slot_bytes = blocksize * (capture[1] if capture else 1) * 2
+        self.shm = shared_memory.SharedMemory(create=True, size=BlockRing.buffer_size(slots, slot_bytes))
+        self.ring = BlockRing(slots, slot_bytes, self.shm.buf)
+        self.ring.reset()
+        self.data_ready = ctx.Event()
+        self.control = ctx.Queue()
+        self.ready = threading.Event()
+        self.flushed = threading.Event()
+        self.error = None
+        self.stats = {"audio_seconds": 0.0, "decode_seconds": 0.0}
+        # Отметка StreamDecoder.watermark() из последнего сообщения воркера
+        self.watermark = None
+        self.process = ctx.Process(
+            target=worker_main, name=f"recognizer:{name}", daemon=True,
+            args=(name, role, level or QualityLevel("default", model_path), sample_rate, streaming, partial_interval, words, vad,
+                  self.shm.name, slots, slot_bytes, self.data_ready, self.control, results, capture, policy),
+        )
+
+    def start(self):
+        self.process.start()
+
+    def wait_ready(self, timeout=WORKER_START_TIMEOUT, poll=0.5):
+        """Ждёт сообщения о готовности. RuntimeError, если воркер упал, не успел или сообщил об ошибке."""
+        deadline = time.monotonic() + timeout
+        while not self.ready.wait(poll):
+            # Упавший до сообщения процесс (импорт, общая память) его уже не пришлёт
+            if not self.process.is_alive():
+                # Сообщение могло прийти перед самым выходом процесса
+                if self.ready.wait(poll):
+                    break
+                raise RuntimeError(f"процесс завершился с кодом {self.process.exitcode}")
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"нет ответа за {timeout:.0f} с")
+        if self.error:
+            raise RuntimeError(self.error)
+
+    def put(self, data, captured_at=None):
+        if captured_at is None:
+            captured_at = time.monotonic()
+        if self.policy == POLICY_BLOCK:
+            self.ring.wait_free(self.block_timeout, self.process.is_alive)
+        ok = self.ring.put(data, captured_at)
+        self.data_ready.set()
+        return ok
+
+    def set_level(self, level):
+        # Воркер загрузит модель в фоне и сменит распознаватель на границе фраз
+        self.control.put(("level", level))
+        self.data_ready.set()
+
+    def flush(self):
+        self.flushed.clear()
+        self.control.put("flush")
+
+    def close(self):
+        if self.process.is_alive():
+            self.control.put("stop")
+            self.data_ready.set()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.ring.release()
+        self.shm.close()
+        self.shm.unlink()
@@ -1,103 +1,546 @@
-import queue
 import threading
 import time
-import json
-from datetime import datetime
-from vosk import Model, KaldiRecognizer
-import sounddevice as sd
-import subprocess
+import queue
+import multiprocessing as mp
+from ring_buffer import CaptureRing, POLICY_BLOCK, POLICY_DROP_OLDEST
+from replay import ReplayStream, wav_format
+from resample import Resampler
+from metrics import LatencyStats, stages, STAGE_CALLBACK, STAGE_FINALIZE
+from transcript import SegmentStore
+from log_writer import TranscriptLogWriter, FORMAT_TEXT, FORMAT_JSONL, DURABILITY_FLUSH
+from recognition import StreamDecoder
+from recognition_worker import ProcessWorker
+from vad import VoiceActivityDetector
+from quality import QualityLevel
+from timeline import TimelineMerger, REORDER_WINDOW
+import model_registry
+
+from devices import sd, registry as device_registry, OutputSwitcher, CAPTURE_OUTPUT, RESTORE_OUTPUT
+
+# Размер блока в сэмплах при 16 кГц: 8000 = 500 мс, 1600 = 100 мс.
+# Устройство с другой частотой отдаёт блоки той же длительности
+BLOCKSIZE = 8000
+STREAMING_BLOCKSIZE = 1600
+# Как часто (в секундах) опрашивать PartialResult() в потоковом режиме
+PARTIAL_INTERVAL = 0.1
+
+ROLE_CLIENT = "👤 КЛИЕНТ"
+ROLE_ADVISOR = "👨‍💼 СОВЕТНИК"
+
+# Каналы по умолчанию: (имя, роль в транскрипте, часть названия устройства ввода)
+DEFAULT_CHANNELS = [
+    ("client", ROLE_CLIENT, "CABLE-A Output"),
+    ("advisor", ROLE_ADVISOR, "microphone"),
+]
+
+# Где работают распознаватели: в потоках процесса с GUI или каждый в своём процессе
+MODE_THREAD = "thread"
+MODE_PROCESS = "process"
+
+
+def capture_time(frames, time_info, sample_rate):
+    """Конец блока по time.monotonic() — общим часам всех потоков и процессов-воркеров.
+
+    PortAudio сообщает, когда АЦП записал первый кадр блока, а колбэк
+    приходит позже на задержку буфера, у каждого устройства свою. Без
+    time_info (воспроизведение файлов) — момент вызова колбэка.
+    """
+    now = time.monotonic()
+    if time_info is None or not (time_info.inputBufferAdcTime and time_info.currentTime):
+        return now
+    return min(now, now - (time_info.currentTime - time_info.inputBufferAdcTime) + frames / sample_rate)
+
+
+class Channel:
+    """Один говорящий: источник звука, кольцо блоков и распознаватель."""
+
+    def __init__(self, name, role, source, ring, device_name=None):
+        self.name = name
+        self.role = role
+        # Номер устройства sounddevice или путь к файлу при воспроизведении
+        self.source = source
+        # Часть названия устройства ввода; номер по нему ищется при каждом старте
+        self.device_name = device_name
+        self.ring = ring
+        # Формат захвата — собственный формат устройства или файла; кадров в блоке при нём
+        self.capture_rate = None
+        self.capture_channels = 1
+        self.capture_blocksize = None
+        self.decoder = None
+        self.worker = None
+
+    def callback(self, indata, frames, time_info, status):
+        # Поток PortAudio: ни print, ни выделения памяти — только копия в слот кольца
+        started = time.perf_counter()
+        if status:
+            self.ring.note_status(status)
+        self.ring.put(indata, capture_time(frames, time_info, self.capture_rate))
+        stages.observe(STAGE_CALLBACK, time.perf_counter() - started)
+
 
 class Recorder:
-    def __init__(self):
+    def __init__(self, queue_size=32, streaming=False, blocksize=None,
+                 partial_interval=PARTIAL_INTERVAL, model_path=model_registry.MODEL_PATH,
+                 replay_files=None, replay_speed=1.0,
+                 channels=None, mode=MODE_THREAD, log_format=FORMAT_TEXT, log_dir=".",
+                 log_flush_interval=1.0, log_durability=DURABILITY_FLUSH, log_max_bytes=0,
+                 vad=True, output_device=CAPTURE_OUTPUT, restore_device=RESTORE_OUTPUT,
+                 output_backend=None, quality=None, native_rate=True, reorder_window=REORDER_WINDOW,
+                 overload_policy=POLICY_DROP_OLDEST, block_timeout=0.1):
         self.running = False
-        self.q_client = queue.Queue()
-        self.q_advisor = queue.Queue()
+        # Воспроизведение файлов вместо устройств: {имя канала: путь}
+        self.replay_files = replay_files
+        self.replay_speed = replay_speed
+        self.mode = mode
+        # Потоковый режим: мелкие блоки и промежуточные гипотезы для живых субтитров
+        self.streaming = streaming
+        if blocksize is None:
+            blocksize = STREAMING_BLOCKSIZE if streaming else BLOCKSIZE
+        self.blocksize = blocksize
+        self.partial_interval = partial_interval
+        # Детектор речи перед декодером: тишина одного говорящего, пока говорит другой, не декодируется
+        self.vad = vad
+        self.partial_text = {}
+        # Задержка субтитров: от звука до появления текста (частичного и итогового)
+        self.partial_latency = LatencyStats()
+        self.final_latency = LatencyStats()
+        self.threads = []
         self.result_text = ""
-        self.model = Model("vosk-model-small-ru-0.22")
+        # Все финализированные реплики обоих говорящих, без потерь между тиками UI
+        self.segments = SegmentStore()
+        self.last_error = ""
+        # Планировщик качества (QualityScheduler): выбирает модель и настройки по нагрузке
+        self.quality = quality
+        self._quality_thread = None
+        self.level = quality.level if quality is not None else QualityLevel("default", model_path)
+        # Модель грузится в фоне и общая на весь процесс; распознаватели создаются по готовности
+        self.model_path = self.level.model_path
+        self.model = None
         self.sample_rate = 16000  # ⚠️ Важно
-        self.rec_client = KaldiRecognizer(self.model, self.sample_rate)
-        self.rec_advisor = KaldiRecognizer(self.model, self.sample_rate)
-        self.client_device_id = self.find_device("CABLE-A Output")
-        self.advisor_device_id = self.find_device("microphone")
-        self.log_file = f"log_{datetime.now().strftime('%Y%m%d')}.txt"
+        # Захват в формате устройства и пересчёт в 16 кГц моно у себя (resample.py).
+        # False — просить у хост-API сразу 16 кГц моно, как раньше
+        self.native_rate = native_rate
+        if mode == MODE_THREAD:
+            model_registry.warm_up(self.model_path)
+        # В режиме процессов у каждого воркера своя модель, результаты приходят сюда
+        self._results = None
+
+        # Кольца на queue_size блоков выделяются заранее (заново — только при смене формата захвата).
+        # При отставании Vosk — overload_policy (block, drop_oldest, coalesce; см. ring_buffer.py).
+        # Без привязки к реальному времени аудио не выбрасываем, а ждём декодер
+        self.queue_size = queue_size
+        if replay_files and replay_speed == 0:
+            overload_policy, block_timeout = POLICY_BLOCK, None
+        self.overload_policy = overload_policy
+        self.block_timeout = block_timeout
+        self.channels = []
+        for name, role, device_name in channels or DEFAULT_CHANNELS:
+            if replay_files:
+                # При воспроизведении можно подать только часть каналов
+                source = replay_files.get(name)
+                if source is None:
+                    continue
+            else:
+                source = self.find_device(device_name)
+            ch = Channel(name, role, source, None, device_name)
+            self._configure_capture(ch)
+            self.channels.append(ch)
+        # Журнал пишется в своём потоке; log_format=None — без журнала (бенчмарки)
+        self.log_writer = None
+        if log_format:
+            self.log_writer = TranscriptLogWriter(log_dir, log_format, log_flush_interval,
+                                                  log_durability, log_max_bytes)
+        # Слова нужны структурированному журналу (уверенность) и сведению диалога (время слов)
+        self.words = log_format == FORMAT_JSONL or reorder_window > 0
+        # Реплики обоих говорящих попадают в транскрипт по времени речи, а не по готовности
+        self.timeline = TimelineMerger(self._publish, reorder_window, metrics=stages)
+        for ch in self.channels:
+            self.timeline.add_stream(ch.role, lambda ch=ch: self._watermark(ch))
+
+        # Вывод системы на время прослушивания уходит в виртуальный кабель и потом возвращается.
+        # При воспроизведении файлов не трогаем, если бэкенд не задан явно (замер пути старта)
+        self.output_device = output_device
+        self.restore_device = restore_device
+        self.switcher = None
+        if not replay_files or output_backend is not None:
+            self.switcher = OutputSwitcher(output_backend)
+        if not replay_files:
+            # Подключение гарнитуры между сессиями подхватится без перезапуска
+            device_registry.watch(is_idle=lambda: not self.running)
+
+    def on_model_ready(self, callback):
+        # callback(model, error) — в потоке загрузчика или сразу, если модель уже готова
+        if self.mode == MODE_PROCESS:
+            # Модели грузятся в воркерах при первом старте
+            callback(None, None)
+            return
+        model_registry.warm_up(self.model_path, callback)
+
+    def is_model_ready(self):
+        return self.mode == MODE_PROCESS or model_registry.registry.is_ready(self.model_path)
+
+    def _ensure_recognizers(self):
+        if self.mode == MODE_PROCESS:
+            return self._ensure_workers()
+        if all(ch.decoder is not None for ch in self.channels):
+            return True
+        try:
+            self.model = model_registry.get_model(self.model_path)
+        except Exception:
+            self.result_text = self.last_error = "❌ Модель распознавания не загружена"
+            return False
+        for ch in self.channels:
+            if ch.decoder is None:
+                ch.decoder = StreamDecoder(
+                    self.level.recognizer(self.model, self.sample_rate, self.words), ch.role, self.sample_rate,
+                    on_partial=self._on_partial, on_final=self._finalize,
+                    streaming=self.streaming, partial_interval=self.partial_interval,
+                    vad=VoiceActivityDetector(self.sample_rate) if self.vad else None,
+                    metrics=stages,
+                    converter=self._converter(ch),
+                )
+        return True
+
+    def _ensure_workers(self):
+        if self._results is None:
+            self._results = mp.get_context("spawn").Queue()
+            threading.Thread(target=self._collect_results, name="recognizer-results", daemon=True).start()
+        for ch in self.channels:
+            if ch.worker is None:
+                ch.worker = ProcessWorker(ch.name, ch.role, self.model_path, self.sample_rate,
+                                          ch.capture_blocksize, self.streaming, self.partial_interval,
+                                          self.words, self._results, vad=self.vad, level=self.level,
+                                          capture=self._resample_from(ch), policy=self.overload_policy,
+                                          block_timeout=self.block_timeout)
+                ch.worker.start()
+        for ch in self.channels:
+            try:
+                ch.worker.wait_ready()
+            except RuntimeError as e:
+                print(f"[ERROR] Воркер {ch.name} не запустился: {e}")
+                self.result_text = self.last_error = "❌ Модель распознавания не загружена"
+                # Общая память и процессы всех каналов: следующий start() создаст их заново
+                for other in self.channels:
+                    if other.worker is not None:
+                        other.worker.close()
+                        other.worker = None
+                raise
+        return True
+
+    def _collect_results(self):
+        # Результаты всех воркеров приходят в одну очередь и превращаются в реплики здесь
+        workers = {}
+        while True:
+            try:
+                message = self._results.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            kind, name = message[0], message[1]
+            if name not in workers:
+                workers.update({ch.name: ch for ch in self.channels})
+            ch = workers[name]
+            if kind == "final":
+                self._finalize(ch.role, *message[2:])
+            elif kind == "partial":
+                self._on_partial(ch.role, *message[2:])
+            elif kind == "progress":
+                ch.worker.watermark = message[2]
+            elif kind == "stats":
+                ch.worker.stats = message[2]
+            elif kind == "stages":
+                for stage, seconds in message[2]:
+                    stages.observe(stage, seconds)
+            elif kind == "flushed":
+                ch.worker.flushed.set()
+            elif kind == "ready":
+                ch.worker.error = message[2]
+                ch.worker.ready.set()
 
     def find_device(self, name_like):
-        for i, dev in enumerate(sd.query_devices()):
-            if name_like.lower() in dev["name"].lower() and dev["max_input_channels"] > 0:
-                return i
-        return None
+        # Список устройств кэшируется; перечитывается только при промахе
+        return device_registry.find_input(name_like)
 
-    def client_callback(self, indata, frames, time_info, status):
-        if status:
-            print("[CLIENT STATUS]", status)
-        self.q_client.put(bytes(indata))
+    def _capture_format(self, source):
+        if not self.native_rate or source is None:
+            return self.sample_rate, 1
+        if self.replay_files:
+            return wav_format(source, self.sample_rate)
+        return device_registry.input_format(source)
 
-    def advisor_callback(self, indata, frames, time_info, status):
-        if status:
-            print("[ADVISOR STATUS]", status)
-        self.q_advisor.put(bytes(indata))
+    def _configure_capture(self, ch):
+        # Пока канал не слушает: кольцо под формат захвата выделяется заново только при его смене
+        rate, channels = self._capture_format(ch.source)
+        if (rate, channels) == (ch.capture_rate, ch.capture_channels):
+            return
+        ch.capture_rate, ch.capture_channels = rate, channels
+        ch.capture_blocksize = round(self.blocksize * rate / self.sample_rate)
+        ch.ring = CaptureRing(self.queue_size, ch.capture_blocksize * channels * 2,
+                              self.overload_policy, self.block_timeout)
+        if ch.decoder is not None:
+            ch.decoder.converter = self._converter(ch)
+        if ch.worker is not None:
+            # Слоты общей памяти воркера рассчитаны на прежний формат
+            ch.worker.close()
+            ch.worker = None
+        if self._resample_from(ch):
+            print(f"[DEBUG] {ch.name}: захват {rate} Гц × {channels} кан. → {self.sample_rate} Гц моно")
+
+    def _resample_from(self, ch):
+        # (частота, каналы) захвата, если его нужно пересчитывать, иначе None
+        if (ch.capture_rate, ch.capture_channels) == (self.sample_rate, 1):
+            return None
+        return ch.capture_rate, ch.capture_channels
+
+    def _converter(self, ch):
+        capture = self._resample_from(ch)
+        return Resampler(capture[0], self.sample_rate, capture[1]) if capture else None
 
-    def listen_stream(self, device_id, callback, recognizer, queue_ref, role):
-        with sd.RawInputStream(samplerate=self.sample_rate, blocksize=8000, dtype='int16',
-                               channels=1, callback=callback, device=device_id):
+    def _open_stream(self, channel, callback):
+        if self.replay_files:
+            return ReplayStream(channel.source, channel.capture_rate, channel.capture_blocksize, callback,
+                                self.replay_speed, channel.capture_channels)
+        return sd.RawInputStream(samplerate=channel.capture_rate, blocksize=channel.capture_blocksize,
+                                 dtype='int16', channels=channel.capture_channels, callback=callback,
+                                 device=channel.source)
+
+    def listen_stream(self, channel):
+        decoder = channel.decoder
+        # Пока поток открыт, фоновая проверка устройств не перезапускает PortAudio
+        with device_registry.in_use(), self._open_stream(channel, channel.callback) as stream:
+            finished = getattr(stream, "finished", None)
+            try:
+                while self.running:
+                    # Просыпаемся сразу по приходу данных; таймаут нужен только для проверки running
+                    item = channel.ring.get(timeout=0.2)
+                    if item is not None:
+                        decoder.feed(*item)
+                    if finished is not None and finished.is_set() and not channel.ring.qsize():
+                        # Файл закончился: дофинализируем последнюю реплику
+                        decoder.finish()
+                        break
+            finally:
+                # Отпускаем продюсера, если он ждёт места в очереди (политика block)
+                channel.ring.close()
+
+    def capture_to_worker(self, channel):
+        # Режим процессов: здесь только захват, распознавание — в воркере канала
+        worker = channel.worker
+
+        def callback(indata, frames, time_info, status):
+            started = time.perf_counter()
+            if status:
+                channel.ring.note_status(status)
+            worker.put(indata, capture_time(frames, time_info, channel.capture_rate))
+            stages.observe(STAGE_CALLBACK, time.perf_counter() - started)
+
+        with device_registry.in_use(), self._open_stream(channel, callback) as stream:
+            finished = getattr(stream, "finished", None)
             while self.running:
-                if not queue_ref.empty():
-                    data = queue_ref.get()
-                    if recognizer.AcceptWaveform(data):
-                        res = json.loads(recognizer.Result())
-                        text = res.get("text", "")
-                        if text:
-                            self.append_log(role, text)
-                            self.result_text = f"{role}: {text}"
-                time.sleep(0.05)
+                if finished is None:
+                    time.sleep(0.2)
+                elif finished.wait(0.2):
+                    # Файл закончился: воркер дочитает кольцо и финализирует реплику
+                    worker.flush()
+                    worker.flushed.wait()
+                    break
+
+    def _on_partial(self, role, text, captured_at):
+        # В среднем звук ждёт в буфере захвата половину блока
+        half_block = self.blocksize / self.sample_rate / 2
+        self.partial_text[role] = text
+        self.partial_latency.add(time.monotonic() - captured_at + half_block)
+
+    def _finalize(self, role, text, start, end, confidence=None):
+        self.partial_text.pop(role, None)
+        if not text:
+            return
+        half_block = self.blocksize / self.sample_rate / 2
+        self.final_latency.add(time.monotonic() - end + half_block)
+        stages.observe(STAGE_FINALIZE, time.monotonic() - end)
+        self.timeline.add(role, start, (role, text, start, end, confidence))
+
+    def _publish(self, final):
+        # Поток сведения: реплика встаёт в транскрипт после всех, начавшихся раньше неё
+        role, text, start, end, confidence = final
+        seg = self.segments.append(role, text, start, end, confidence)
+        self.append_log(seg)
+        self.result_text = f"{role}: {text}"
+
+    def _watermark(self, ch):
+        if ch.worker is not None:
+            return ch.worker.watermark
+        return ch.decoder.watermark() if ch.decoder is not None else None
 
     def start(self):
         print("[DEBUG] recorder.start() вызван")
 
-        if self.client_device_id is None or self.advisor_device_id is None:
+        if self.running:
+            return
+        # От выбора устройств до running=True фоновая проверка не перезапускает PortAudio:
+        # номера устройств уже выбраны, а потоки вот-вот откроются
+        with device_registry.in_use():
+            self._start()
+
+    def _start(self):
+        if not self.replay_files:
+            # Номера устройств могли смениться после переподключения
+            for ch in self.channels:
+                ch.source = self.find_device(ch.device_name)
+        if not self.replay_files and any(ch.source is None for ch in self.channels):
             print("[Recorder] Не найдены устройства. Транскрипция не запущена.")
-            self.result_text = "❌ Устройства не найдены"
+            self.result_text = self.last_error = "❌ Устройства не найдены"
             return
 
-        # ⚠️ Вывод системы на CABLE-A Input
+        for ch in self.channels:
+            self._configure_capture(ch)
         try:
-            subprocess.call(["nircmdc.exe", "setdefaultsounddevice", "CABLE-A Input", "0"])
-            print("[DEBUG] Переключено устройство вывода на CABLE-A Input")
-            time.sleep(1)
-        except Exception as e:
-            print(f"[ERROR] Не удалось переключить устройство: {e}")
-
-        if self.running:
+            if not self._ensure_recognizers():
+                return
+        except RuntimeError:
+            # Причина уже в last_error: её покажет окно или сервис
             return
+
+        if self.switcher is not None:
+            # Захват стартует сразу, не дожидаясь переключения: до него в кабеле просто тишина
+            self.switcher.switch(self.output_device)
+
         self.running = True
-        self.result_text = ""
+        self.result_text = self.last_error = ""
+        self.partial_text.clear()
+        self.partial_latency.clear()
+        self.final_latency.clear()
 
-        self.t_client = threading.Thread(
-            target=self.listen_stream,
-            args=(self.client_device_id, self.client_callback, self.rec_client, self.q_client, "👤 КЛИЕНТ"),
-            daemon=True
-        )
-        self.t_advisor = threading.Thread(
-            target=self.listen_stream,
-            args=(self.advisor_device_id, self.advisor_callback, self.rec_advisor, self.q_advisor, "👨‍💼 СОВЕТНИК"),
-            daemon=True
-        )
+        self.threads = []
+        for ch in self.channels:
+            ch.ring.open()
+            ch.ring.clear()
+            ch.ring.reset_stats()
+            if ch.decoder is not None and ch.decoder.converter is not None:
+                # Хвост фильтра от прошлой сессии не должен попасть в начало новой
+                ch.decoder.converter.reset()
+            target = self.capture_to_worker if self.mode == MODE_PROCESS else self.listen_stream
+            # Имена потоков различает сэмплирующий профайлер
+            kind = "capture" if self.mode == MODE_PROCESS else "recognizer"
+            t = threading.Thread(target=target, args=(ch,), name=f"{kind}:{ch.name}", daemon=True)
+            t.start()
+            self.threads.append(t)
+        if self.quality is not None:
+            # Кольца только что обнулены (кольца воркеров и счётчики декодеров — нет):
+            # разности считаются от текущих значений, а не от итогов прошлого захвата
+            self.quality.reset_counters({
+                name: (s.get("audio_seconds", 0.0), s.get("decode_seconds", 0.0), s["dropped_blocks"])
+                for name, s in self.get_stats().items()
+            })
+        if self.quality is not None and not (self._quality_thread and self._quality_thread.is_alive()):
+            self._quality_thread = threading.Thread(target=self._watch_quality, name="quality", daemon=True)
+            self._quality_thread.start()
 
-        self.t_client.start()
-        self.t_advisor.start()
+    def _watch_quality(self):
+        while self.running:
+            time.sleep(self.quality.interval)
+            for name, s in self.get_stats().items():
+                self.quality.observe(name, s.get("audio_seconds", 0.0), s.get("decode_seconds", 0.0),
+                                     s["depth"], s["maxsize"], s["dropped_blocks"])
+            level, reason = self.quality.decide()
+            if level is not None:
+                self.set_level(level)
+
+    def set_level(self, level):
+        """Переход на другой уровень качества со следующей фразы каждого потока."""
+        self.level = level
+        self.model_path = level.model_path
+        if self.mode == MODE_PROCESS:
+            for ch in self.channels:
+                if ch.worker is not None:
+                    ch.worker.set_level(level)
+            return
+
+        def ready(model, error):
+            # Модель грузится в фоне, пока потоки распознают старой
+            if error is not None or self.level is not level:
+                return
+            self.model = model
+            for ch in self.channels:
+                if ch.decoder is not None:
+                    ch.decoder.request_switch(level.recognizer(model, self.sample_rate, self.words), level.name)
+        model_registry.warm_up(level.model_path, ready)
+
+    def wait(self, timeout=None):
+        # Для воспроизведения: дождаться, пока все файлы будут распознаны
+        for t in self.threads:
+            t.join(timeout)
+        self.running = False
+        self.timeline.flush()
 
     def stop(self):
         self.running = False
-        try:
-            subprocess.call(["nircmdc.exe", "setdefaultsounddevice", "Headset Earphone", "0"])
-            print("[DEBUG] Устройство вывода возвращено на Headset Earphone")
-        except Exception as e:
-            print(f"[ERROR] Не удалось вернуть устройство: {e}")
+        # Потоки больше не продвинутся: ждущие реплики выдаются сразу
+        self.timeline.flush()
+        if self.streaming:
+            print("[DEBUG] Задержка субтитров:", self.get_caption_latency())
+        if self.switcher is not None:
+            # Возврат тоже в фоне: stop() вызывается из потока GUI
+            self.switcher.restore(self.restore_device)
+
+    def close(self):
+        # Останавливает процессы-воркеры, дописывает журнал на диск
+        # и дожидается возврата вывода системы
+        if self.running:
+            self.stop()
+        self.running = False
+        self.timeline.close()
+        if self.switcher is not None:
+            self.switcher.close()
+        for ch in self.channels:
+            if ch.worker is not None:
+                ch.worker.close()
+                ch.worker = None
+        if self.log_writer is not None:
+            self.log_writer.close()
+
+    def get_stats(self):
+        # Глубина очередей и потерянное аудио: видно, когда машина не успевает за потоками
+        stats = {}
+        for ch in self.channels:
+            if ch.worker is not None:
+                # Аудио идёт мимо кольца канала, но флаги PortAudio копятся в нём
+                stats[ch.name] = {**ch.worker.ring.stats(), "policy": ch.worker.policy}
+                stats[ch.name]["input_overflows"] = ch.ring.input_overflows
+                stats[ch.name]["input_underflows"] = ch.ring.input_underflows
+                decode = ch.worker.stats
+            else:
+                stats[ch.name] = ch.ring.stats()
+                decode = ch.decoder.stats if ch.decoder else None
+            stats[ch.name]["capture_rate"] = ch.capture_rate
+            stats[ch.name]["capture_channels"] = ch.capture_channels
+            if decode and decode["audio_seconds"]:
+                stats[ch.name].update(decode)
+                # Коэффициент реального времени декодера: < 1 — успеваем
+                rtf = decode["decode_seconds"] / decode["audio_seconds"]
+                stats[ch.name]["rtf"] = rtf
+                if "skipped_seconds" in decode:
+                    # Оценка сэкономленного времени декодера: пропущенная тишина по текущему RTF
+                    stats[ch.name]["vad_saved_seconds"] = decode["skipped_seconds"] * rtf
+        return stats
+
+    def get_caption_latency(self):
+        return {
+            "blocksize": self.blocksize,
+            "partial_interval": self.partial_interval,
+            "partial": self.partial_latency.summary(),
+            "final": self.final_latency.summary(),
+        }
+
+    def get_partial_text(self):
+        # Текущие промежуточные гипотезы по ролям (пусто, если всё финализировано)
+        return "\n".join(f"{role}: {text}…" for role, text in list(self.partial_text.items()))
 
     def get_latest_text(self):
         return self.result_text or "Ожидание..."
 
-    def append_log(self, role, text):
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            timestamp = datetime.now().strftime('%H:%M:%S')
-            f.write(f"[{timestamp}] {role}: {text}\n")
+    def append_log(self, seg):
+        # Не блокирует: запись уходит в поток журнала
+        if self.log_writer is not None:
+            self.log_writer.write_segment(seg)
@@ -0,0 +1,86 @@
+import threading
+import time
+import wave
+
+SAMPLE_WIDTH = 2  # int16
+
+
+def wav_format(path, sample_rate=16000):
+    """(частота, число каналов) файла; сырой PCM считается моно sample_rate Гц."""
+    if path.lower().endswith((".pcm", ".raw")):
+        return sample_rate, 1
+    with wave.open(path, "rb") as wf:
+        return wf.getframerate(), wf.getnchannels()
+
+
+def read_pcm(path, sample_rate=16000, channels=1):
+    """Читает WAV или сырой PCM (int16) и возвращает байты сэмплов."""
+    if path.lower().endswith((".pcm", ".raw")):
+        with open(path, "rb") as f:
+            return f.read()
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != SAMPLE_WIDTH or wf.getnchannels() != channels or wf.getframerate() != sample_rate:
+            raise ValueError(
+                f"{path}: нужен WAV int16 {channels} кан. {sample_rate} Гц, а не "
+                f"{wf.getsampwidth() * 8} бит / {wf.getnchannels()} кан. / {wf.getframerate()} Гц")
+        return wf.readframes(wf.getnframes())
+
+
+def audio_seconds(path, sample_rate=16000):
+    rate, channels = wav_format(path, sample_rate)
+    return len(read_pcm(path, rate, channels)) / SAMPLE_WIDTH / channels / rate
+
+
+class ReplayStream:
+    """Подмена sd.RawInputStream: подаёт файл в тот же колбэк блоками.
+
+    speed=1.0 — в реальном времени, 2.0 — вдвое быстрее,
+    0 — настолько быстро, насколько успевает потребитель.
+    """
+
+    def __init__(self, path, samplerate, blocksize, callback, speed=1.0, channels=1):
+        self.path = path
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.speed = speed
+        # Байт на кадр: сэмплы всех каналов чередуются, как в RawInputStream
+        self.frame_bytes = SAMPLE_WIDTH * channels
+        self.data = read_pcm(path, samplerate, channels)
+        self.duration = len(self.data) / self.frame_bytes / samplerate
+        # Выставляется, когда весь файл отдан в колбэк
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"replay:{self.path}", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        step = self.blocksize * self.frame_bytes
+        block_seconds = self.blocksize / self.samplerate
+        started = time.monotonic()
+        for n, offset in enumerate(range(0, len(self.data), step)):
+            if self._stop.is_set():
+                break
+            if self.speed > 0:
+                # Блок «записан» к моменту своего окончания, как у настоящего устройства
+                delay = started + (n + 1) * block_seconds / self.speed - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+            block = self.data[offset:offset + step]
+            self.callback(block, len(block) // self.frame_bytes, None, None)
+        self.finished.set()
@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Частота, на которой работает распознаватель
+TARGET_RATE = 16000
+# Сколько выходных сэмплов одной фазы окупают отдельный вызов einsum без копирования окон
+MIN_ROWS_PER_PHASE = 32
+
+
+def design_filter(up, down, width=16, rolloff=0.9, beta=8.0):
+    """Прототип ФНЧ для полифазного ресэмплинга up/down (оконный sinc, окно Кайзера).
+
+    Срез — rolloff от меньшей из двух частот Найквиста, width — число
+    переходов через ноль sinc по каждую сторону от центра. Длина
+    нечётная, чтобы задержка фильтра была целой на повышенной частоте.
+    Возвращает (фильтр длиной taps * up, taps, задержка).
+    """
+    cutoff = rolloff * 0.5 / max(up, down)
+    taps = math.ceil(2 * width * max(up, down) / up) + 1
+    length = taps * up - 1
+    delay = (length - 1) // 2
+    t = np.arange(length) - delay
+    h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(length, beta) * up
+    return np.append(h, 0.0), taps, delay
+
+
+class Resampler:
+    """Приведение блоков захвата int16 (in_rate Гц, channels каналов) к int16 моно out_rate Гц.
+
+    Каналы сводятся усреднением, затем полифазный FIR-фильтр считает
+    только нужные выходные сэмплы: каждый — скалярное произведение окна
+    последних taps входных сэмплов на строку коэффициентов его фазы.
+    Сэмплы одной фазы считаются одним einsum по срезу окон, так что на
+    блок приходится up вызовов NumPy (один при кратных частотах); для
+    коротких блоков окна всех сэмплов собираются в матрицу и хватает
+    одного вызова.
+    Состояние (хвост входа и номер следующего выходного сэмпла)
+    переносится между блоками, поэтому результат не зависит от размера
+    блока. Выход отстаёт от входа на половину фильтра — около taps / 2
+    входных сэмплов.
+    """
+
+    def __init__(self, in_rate, out_rate=TARGET_RATE, channels=1, width=16, rolloff=0.9, beta=8.0):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+        g = math.gcd(in_rate, out_rate)
+        self.up, self.down = out_rate // g, in_rate // g
+        if self.up == self.down:
+            # Только сведение каналов
+            self.taps, self.delay, self._phases = 1, 0, np.ones((1, 1), dtype=np.float32)
+        else:
+            h, self.taps, self.delay = design_filter(self.up, self.down, width, rolloff, beta)
+            # Строка фазы p: h[p], h[p + up], ... в обратном порядке — под окно входа по возрастанию
+            self._phases = np.ascontiguousarray(h.reshape(self.taps, self.up).T[:, ::-1], dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        # Перед входом — taps нулей, чтобы у первых выходных сэмплов было полное окно
+        self._buf = np.zeros(self.taps, dtype=np.float32)
+        self._start = -self.taps
+        self._next = 0
+
+    def downmix(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        if self.channels == 1:
+            return samples.astype(np.float32)
+        frames = samples[:len(samples) - len(samples) % self.channels].astype(np.float32)
+        frames = frames.reshape(-1, self.channels)
+        # Сумма столбцов заметно быстрее mean(axis=1) по коротким строкам
+        mono = frames[:, 0].copy()
+        for channel in range(1, self.channels):
+            mono += frames[:, channel]
+        mono *= 1 / self.channels
+        return mono
+
+    def process(self, data):
+        """Блок захвата (bytes или memoryview) -> bytes int16 моно out_rate Гц."""
+        buf = np.concatenate((self._buf, self.downmix(data)))
+        end = self._start + len(buf)
+        # Выходной сэмпл n лежит на повышенной частоте в точке n * down + delay,
+        # его можно посчитать, когда пришёл входной сэмпл (n * down + delay) // up
+        stop = -((self.delay - end * self.up) // self.down)
+        count = max(0, stop - self._next)
+        windows = sliding_window_view(buf, self.taps)
+        if count < MIN_ROWS_PER_PHASE * self.up:
+            # Короткий блок при многих фазах (44.1 кГц: up = 160): один einsum по выборке окон
+            positions = np.arange(self._next, stop, dtype=np.int64) * self.down + self.delay
+            rows = windows[positions // self.up - self._start - (self.taps - 1)]
+            out = np.einsum("ij,ij->i", rows, self._phases[positions % self.up])
+        else:
+            out = np.empty(count, dtype=np.float32)
+            for r in range(self.up):
+                position = (self._next + r) * self.down + self.delay
+                first = position // self.up - self._start - (self.taps - 1)
+                # Сэмплы r, r + up, r + 2 * up, ... — одна фаза фильтра, а их окна
+                # сдвинуты на down входных сэмплов: срез без копирования
+                rows = windows[first::self.down][:len(range(r, count, self.up))]
+                out[r::self.up] = np.einsum("ij,j->i", rows, self._phases[position % self.up])
+        self._next = max(stop, self._next)
+        # Хвост, нужный следующему блоку: окно первого ещё не посчитанного сэмпла
+        keep = (self._next * self.down + self.delay) // self.up - self._start - (self.taps - 1)
+        keep = min(keep, len(buf) - self.taps)
+        self._buf = buf[keep:]
+        self._start += keep
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16).tobytes()
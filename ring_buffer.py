@@ -0,0 +1,305 @@
+import struct
+import threading
+import time
+
+# Политики переполнения. Писатель (колбэк захвата) никогда не трогает сторону читателя,
+# поэтому drop_oldest и coalesce выполняет читатель, когда отстал на high_water блоков
+POLICY_BLOCK = "block"              # писатель ждёт свободный слот (не дольше block_timeout)
+POLICY_DROP_OLDEST = "drop_oldest"  # читатель догоняет писателя, пропуская самые старые блоки
+POLICY_COALESCE = "coalesce"        # читатель забирает несколько блоков за один проход
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COALESCE)
+# Максимальный размер склеенного блока в байтах
+COALESCE_LIMIT = 64000
+
+# Счётчики в начале буфера: записано блоков, прочитано блоков, переполнений (блоков/байт),
+# пропущено читателем (блоков/байт), склеено блоков; последний не используется
+_COUNTERS = 8
+_COUNTERS_BYTES = 8 * _COUNTERS
+# Заголовок слота: длина полезных данных и время захвата блока
+_SLOT_HEADER = struct.Struct("<qd")
+
+
+class BlockRing:
+    """Кольцевой буфер аудиоблоков для одного писателя и одного читателя.
+
+    Все данные лежат в заранее выделенном буфере (bytearray или
+    SharedMemory.buf), поэтому писатель и читатель могут быть в разных
+    процессах. Писатель не выделяет память: при заполнении новый блок
+    отбрасывается и учитывается в счётчиках переполнения (wait_free() —
+    подождать слот перед записью). Каждый счётчик пишет только одна
+    сторона, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, slots, slot_bytes, buf=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.slot_stride = _SLOT_HEADER.size + slot_bytes
+        if buf is None:
+            buf = bytearray(self.buffer_size(slots, slot_bytes))
+        self._buf = memoryview(buf).cast("B")
+        self._counters = self._buf[:_COUNTERS_BYTES].cast("q")
+
+    @staticmethod
+    def buffer_size(slots, slot_bytes):
+        return _COUNTERS_BYTES + slots * (_SLOT_HEADER.size + slot_bytes)
+
+    def reset(self):
+        # Только когда ни писатель, ни читатель не работают
+        for i in range(_COUNTERS):
+            self._counters[i] = 0
+
+    def _offset(self, index):
+        return _COUNTERS_BYTES + (index % self.slots) * self.slot_stride
+
+    def put(self, data, captured_at):
+        """Пишет блок в свободный слот. Возвращает False при переполнении."""
+        data = memoryview(data).cast("B")
+        n = data.nbytes
+        if n > self.slot_bytes:
+            raise ValueError(f"Блок {n} байт больше слота {self.slot_bytes} байт")
+        write = self._counters[0]
+        if write - self._counters[1] >= self.slots:
+            self._counters[2] += 1
+            self._counters[3] += n
+            return False
+        offset = self._offset(write)
+        _SLOT_HEADER.pack_into(self._buf, offset, n, captured_at)
+        start = offset + _SLOT_HEADER.size
+        self._buf[start:start + n] = data
+        # Публикуем слот только после того, как данные записаны
+        self._counters[0] = write + 1
+        return True
+
+    def peek(self):
+        """(captured_at, memoryview) старейшего блока без копирования или None.
+
+        Представление действительно до вызова advance().
+        """
+        read = self._counters[1]
+        if read == self._counters[0]:
+            return None
+        offset = self._offset(read)
+        n, captured_at = _SLOT_HEADER.unpack_from(self._buf, offset)
+        start = offset + _SLOT_HEADER.size
+        return captured_at, self._buf[start:start + n]
+
+    def advance(self, count=1):
+        self._counters[1] = min(self._counters[1] + count, self._counters[0])
+
+    def wait_free(self, timeout=None, keep_waiting=None):
+        """Писатель ждёт свободный слот (POLICY_BLOCK). Возвращает True, если слот есть.
+
+        timeout=None — ждать сколько угодно, пока keep_waiting() истинно.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.free():
+            if keep_waiting is not None and not keep_waiting():
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def drop_oldest(self, keep):
+        """Читатель пропускает старейшие блоки, оставляя keep последних. Возвращает число пропущенных."""
+        read, excess = self._counters[1], self.depth() - keep
+        if excess <= 0:
+            return 0
+        for index in range(read, read + excess):
+            self._counters[5] += _SLOT_HEADER.unpack_from(self._buf, self._offset(index))[0]
+        self._counters[4] += excess
+        self._counters[1] = read + excess
+        return excess
+
+    def peek_coalesced(self, out, limit):
+        """Склеивает подряд идущие блоки в out, пока влезают в limit байт.
+
+        Возвращает (captured_at последнего блока, memoryview out, число блоков)
+        или None; блоки освобождает advance(число блоков).
+        """
+        read, depth = self._counters[1], self.depth()
+        total, count, captured_at = 0, 0, None
+        while count < depth:
+            offset = self._offset(read + count)
+            n, at = _SLOT_HEADER.unpack_from(self._buf, offset)
+            if count and total + n > limit:
+                break
+            start = offset + _SLOT_HEADER.size
+            out[total:total + n] = self._buf[start:start + n]
+            total, count, captured_at = total + n, count + 1, at
+        if not count:
+            return None
+        self._counters[6] += count - 1
+        return captured_at, memoryview(out)[:total], count
+
+    def depth(self):
+        return self._counters[0] - self._counters[1]
+
+    def free(self):
+        return self.slots - self.depth()
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "maxsize": self.slots,
+            "put_blocks": self._counters[0] + self._counters[2],
+            # Потеряно всего: не влезло в кольцо плюс пропущено читателем
+            "dropped_blocks": self._counters[2] + self._counters[4],
+            "dropped_bytes": self._counters[3] + self._counters[5],
+            "overflow_blocks": self._counters[2],
+            "overflow_bytes": self._counters[3],
+            "skipped_blocks": self._counters[4],
+            "skipped_bytes": self._counters[5],
+            "coalesced_blocks": self._counters[6],
+        }
+
+    def release(self):
+        # Освобождаем представления, иначе SharedMemory.close() откажется закрываться
+        self._counters.release()
+        self._buf.release()
+
+
+class RingReader:
+    """Читательская сторона BlockRing с политикой переполнения.
+
+    Пока отставание меньше high_water блоков, next() отдаёт по одному
+    блоку без копирования. Дальше при drop_oldest читатель пропускает
+    старейшие блоки, оставляя high_water последних, а при coalesce
+    забирает подряд до coalesce_limit байт одной копией: на блок
+    приходится меньше вызовов декодера, и аудио не теряется. Запас
+    кольца сверх high_water принимает блоки, пока читатель занят.
+    """
+
+    def __init__(self, ring, policy=POLICY_DROP_OLDEST, high_water=None, coalesce_limit=COALESCE_LIMIT):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {policy}")
+        self.ring = ring
+        self.policy = policy
+        self.high_water = high_water or max(1, ring.slots // 2)
+        self._scratch = None
+        if policy == POLICY_COALESCE:
+            self.coalesce_limit = max(coalesce_limit, ring.slot_bytes)
+            self._scratch = bytearray(self.coalesce_limit)
+        self.held = 0
+
+    def next(self):
+        """(captured_at, memoryview) следующего блока или None, если кольцо пусто.
+
+        Предыдущий блок освобождается; представление действительно до
+        следующего вызова next() или release().
+        """
+        self.release()
+        if self.ring.depth() >= self.high_water:
+            if self.policy == POLICY_DROP_OLDEST:
+                self.ring.drop_oldest(self.high_water)
+            elif self.policy == POLICY_COALESCE:
+                item = self.ring.peek_coalesced(self._scratch, self.coalesce_limit)
+                if item is not None:
+                    self.held = item[2]
+                    return item[:2]
+        item = self.ring.peek()
+        if item is not None:
+            self.held = 1
+        return item
+
+    def release(self):
+        if self.held:
+            self.ring.advance(self.held)
+            self.held = 0
+
+    def reset(self):
+        self.held = 0
+
+
+class CaptureRing:
+    """Кольцо между колбэком захвата и потоком распознавания одного процесса.
+
+    Колбэк звукового потока только копирует блок в заранее выделенный слот:
+    без выделения памяти, без очереди и без блокировок на каждом блоке.
+    Читатель получает memoryview слота без копирования; слот освобождается
+    следующим вызовом get(). Переполнение разбирается по policy (см.
+    RingReader); при block писатель ждёт свободный слот не дольше
+    block_timeout (None — сколько угодно: воспроизведение без привязки к
+    реальному времени), а не дождавшись, теряет новый блок.
+    """
+
+    def __init__(self, slots, slot_bytes, policy=POLICY_DROP_OLDEST, block_timeout=0.1,
+                 coalesce_limit=COALESCE_LIMIT):
+        self.ring = BlockRing(slots, slot_bytes)
+        self.reader = RingReader(self.ring, policy, coalesce_limit=coalesce_limit)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._data_ready = threading.Event()
+        self._closed = False
+        self.max_depth = 0
+        # Флаги PortAudio из колбэка: переполнение/опустошение буфера устройства
+        self.input_overflows = 0
+        self.input_underflows = 0
+
+    def put(self, data, captured_at=None):
+        """Пишет блок. Возвращает False, если блок потерян."""
+        if captured_at is None:
+            captured_at = time.monotonic()
+        if self.policy == POLICY_BLOCK:
+            self.ring.wait_free(self.block_timeout, lambda: not self._closed)
+        if self._closed:
+            return False
+        ok = self.ring.put(data, captured_at)
+        # Будим читателя, только если он спит: блокировка Event берётся раз на пробуждение
+        if not self._data_ready.is_set():
+            self._data_ready.set()
+        return ok
+
+    def note_status(self, status):
+        # status — sounddevice.CallbackFlags из колбэка
+        if status.input_overflow:
+            self.input_overflows += 1
+        if status.input_underflow:
+            self.input_underflows += 1
+
+    def get(self, timeout=None):
+        """(captured_at, memoryview) следующего блока или None по таймауту.
+
+        Представление действительно до следующего вызова get().
+        """
+        # Глубину меряем до того, как читатель начнёт догонять писателя
+        self.max_depth = max(self.max_depth, self.ring.depth())
+        item = self.reader.next()
+        if item is None:
+            # Сначала сбрасываем флаг, потом проверяем ещё раз: так не теряется сигнал о новом блоке
+            self._data_ready.clear()
+            item = self.reader.next()
+            if item is None:
+                self._data_ready.wait(timeout)
+                item = self.reader.next()
+        return item
+
+    def qsize(self):
+        return self.ring.depth() - self.reader.held
+
+    def open(self):
+        self._closed = False
+
+    def close(self):
+        # Отпускает писателя, ждущего свободный слот, и будит читателя
+        self._closed = True
+        self._data_ready.set()
+
+    def clear(self):
+        # Только пока поток захвата не запущен
+        self.ring.reset()
+        self.reader.reset()
+
+    def reset_stats(self):
+        self.max_depth = 0
+        self.input_overflows = 0
+        self.input_underflows = 0
+
+    def stats(self):
+        return {
+            **self.ring.stats(),
+            "policy": self.policy,
+            "max_depth": self.max_depth,
+            "input_overflows": self.input_overflows,
+            "input_underflows": self.input_underflows,
+        }
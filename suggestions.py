@@ -0,0 +1,81 @@
+import collections
+import time
+
+# Запрос, с которым запускается упреждающая подсказка
+SUGGEST_QUERY = ("Клиент только что договорил. Коротко подскажи советнику, что ответить "
+                 "или уточнить, 2–3 пункта.")
+
+
+class SuggestionPolicy:
+    """Когда запускать упреждающую подсказку и во что она может обойтись.
+
+    Подсказка запускается через debounce секунд тишины после реплики
+    клиента; новая реплика отменяет идущую подсказку и заново заводит
+    таймер. Частота ограничена паузой min_interval между запусками и
+    max_per_hour за скользящий час, цена одного запроса — бюджетом промпта
+    prompt_tokens и потолком ответа max_tokens, а всех подсказок за звонок —
+    call_token_budget (промпт плюс ответ; 0 — без ограничения). Слишком
+    короткие реплики (min_chars) вроде «да» или «угу» подсказку не запускают.
+    Без блокировок: все методы и counters — только из потока GUI.
+    """
+
+    def __init__(self, debounce=1.2, min_interval=15.0, max_per_hour=60,
+                 prompt_tokens=1500, max_tokens=300, min_chars=12, call_token_budget=20000):
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.max_per_hour = max_per_hour
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.min_chars = min_chars
+        self.call_token_budget = call_token_budget
+        self.spent_tokens = 0
+        self._started = collections.deque()
+        self.counters = {"triggered": 0, "started": 0, "cancelled": 0, "completed": 0,
+                         "rate_limited": 0, "busy": 0, "budget_exhausted": 0}
+
+    def wants(self, seg):
+        """Стоит ли реплика того, чтобы заводить таймер."""
+        return len(seg.text.strip()) >= self.min_chars
+
+    def allow(self, now=None):
+        """(можно ли запускать сейчас, причина отказа)."""
+        now = time.monotonic() if now is None else now
+        while self._started and now - self._started[0] > 3600:
+            self._started.popleft()
+        if self._started and now - self._started[-1] < self.min_interval:
+            return False, f"пауза {self.min_interval:.0f} с"
+        if len(self._started) >= self.max_per_hour:
+            return False, f"лимит {self.max_per_hour} в час"
+        remaining = self.remaining_tokens()
+        if remaining is not None and remaining < self.prompt_tokens + self.max_tokens:
+            # Следующая подсказка может стоить до prompt_tokens + max_tokens
+            self.counters["budget_exhausted"] += 1
+            return False, f"бюджет звонка {self.call_token_budget} токенов исчерпан"
+        return True, None
+
+    def record(self, prompt_tokens=0, response_tokens=0, now=None):
+        """Запуск подсказки: prompt_tokens + response_tokens списываются с бюджета звонка.
+
+        Длина ответа заранее неизвестна, поэтому response_tokens — резерв
+        (обычно max_tokens), а settle() возвращает неиспользованное.
+        Отменённая подсказка остаётся списанной по резерву.
+        """
+        self._started.append(time.monotonic() if now is None else now)
+        self.counters["started"] += 1
+        self.spent_tokens += prompt_tokens + response_tokens
+
+    def settle(self, reserved, used):
+        self.spent_tokens -= max(0, reserved - used)
+
+    def reset_budget(self):
+        # Новый звонок — начало или конец прослушивания
+        self.spent_tokens = 0
+
+    def remaining_tokens(self):
+        if not self.call_token_budget:
+            return None
+        return max(0, self.call_token_budget - self.spent_tokens)
+
+    def get_stats(self):
+        return {**self.counters, "last_hour": len(self._started), "spent_tokens": self.spent_tokens,
+                "remaining_tokens": self.remaining_tokens()}
@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from metrics import STAGE_REORDER
+
+# Сколько секунд реплика может ждать, пока отстающий поток догонит её по времени.
+# Больше — точнее порядок при отставании распознавания, меньше — быстрее субтитры; 0 — без сведения
+try:
+    REORDER_WINDOW = float(os.getenv("ADVISOR_REORDER_WINDOW", "1.0"))
+except ValueError:
+    print(f"[ERROR] Неверное ADVISOR_REORDER_WINDOW={os.getenv('ADVISOR_REORDER_WINDOW')!r}, используется 1.0")
+    REORDER_WINDOW = 1.0
+
+
+class TimelineMerger:
+    """Сводит реплики нескольких потоков в один диалог по времени речи.
+
+    Потоки финализируют реплики независимо и с разной задержкой, поэтому
+    реплика ждёт здесь, пока каждый другой поток не продвинется дальше её
+    начала: его watermark() — самый ранний момент (часы захвата), с которого
+    у него ещё может начаться реплика. Ждать больше window секунд реплика
+    не будет: window — потолок добавочной задержки, больший window чинит
+    порядок при большем отставании потока ценой задержки субтитров.
+    window=0 — реплики выдаются сразу, в порядке финализации.
+    on_release(item) вызывается под блокировкой сведения в его потоке (при
+    window=0 — в потоке, вызвавшем add()) и не должен звать add().
+    """
+
+    def __init__(self, on_release, window=REORDER_WINDOW, poll=0.05, metrics=None):
+        self.on_release = on_release
+        self.window = window
+        self.poll = poll
+        self.metrics = metrics
+        self._streams = {}
+        self._pending = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._last_start = None
+        self._last_arrival = -1
+        self.counters = {"released": 0, "reordered": 0, "timeouts": 0, "late": 0}
+
+    def add_stream(self, name, watermark):
+        # watermark() -> time.monotonic() или None, пока поток ничего не прислал
+        with self._cond:
+            self._streams[name] = watermark
+
+    def add(self, stream, start, item):
+        with self._cond:
+            if self.window <= 0:
+                self._release(start, next(self._order), item, 0.0)
+                return
+            heapq.heappush(self._pending, (start, next(self._order), stream, item, time.monotonic()))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="timeline", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def flush(self):
+        """Выдаёт все ждущие реплики: потоки остановлены, ждать больше нечего."""
+        with self._cond:
+            now = time.monotonic()
+            while self._pending:
+                start, n, _, item, arrived = heapq.heappop(self._pending)
+                self._release(start, n, item, now - arrived)
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _run(self):
+        # Выдача идёт под блокировкой: flush() из другого потока не перемешает порядок
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                while self._pending and self._ready(self._pending[0], now):
+                    start, n, _, item, arrived = heapq.heappop(self._pending)
+                    self._release(start, n, item, now - arrived)
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                # Следующая проверка — когда потоки могли продвинуться или истечёт окно старейшей
+                oldest = min(entry[4] for entry in self._pending)
+                self._cond.wait(min(self.poll, max(0.0, oldest + self.window - now)))
+
+    def _ready(self, entry, now):
+        start, _, stream, _, _ = entry
+        waiting = {e[2] for e in self._pending}
+        for name, watermark in self._streams.items():
+            # У потока с ждущей репликой все следующие начнутся позже неё, а она не раньше головы
+            if name == stream or name in waiting:
+                continue
+            mark = watermark()
+            if mark is None or mark < start:
+                # Окно отсчитывается от старейшей ждущей: голова могла прийти позже неё
+                if now - min(e[4] for e in self._pending) >= self.window:
+                    self.counters["timeouts"] += 1
+                    return True
+                return False
+        return True
+
+    def _release(self, start, n, item, waited):
+        if self._last_start is not None and start < self._last_start:
+            # Опоздала дальше окна: реплика, начавшаяся позже, уже выдана
+            self.counters["late"] += 1
+        if n < self._last_arrival:
+            # Финализирована раньше уже выданной, но началась позже неё
+            self.counters["reordered"] += 1
+        self._last_start = start if self._last_start is None else max(self._last_start, start)
+        self._last_arrival = max(self._last_arrival, n)
+        self.counters["released"] += 1
+        if self.metrics is not None:
+            self.metrics.observe(STAGE_REORDER, waited)
+        try:
+            self.on_release(item)
+        except Exception as e:
+            print(f"[ERROR] Сведение диалога: {e}")
+
+    def get_stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {**self.counters, "pending": pending, "window": self.window}
@@ -0,0 +1,86 @@
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+def to_wall(monotonic_ts):
+    """Переводит отметку time.monotonic() во время time.time()."""
+    return time.time() - (time.monotonic() - monotonic_ts)
+
+
+@dataclass(frozen=True)
+class Segment:
+    """Финализированная реплика одного говорящего."""
+    seq: int          # монотонный номер, начиная с 1
+    role: str
+    text: str
+    start: float      # time.monotonic() начала и конца реплики
+    end: float
+    wall_time: float = field(default_factory=time.time)
+    # Средняя уверенность по словам, если распознаватель выдаёт слова (SetWords)
+    confidence: float = None
+
+    @property
+    def wall_start(self):
+        return to_wall(self.start)
+
+    @property
+    def wall_end(self):
+        return to_wall(self.end)
+
+    def line(self):
+        return f"{self.role}: {self.text}"
+
+
+class SegmentStore:
+    """Потокобезопасное хранилище реплик только на добавление.
+
+    Читатели забирают новые реплики через segments_since(seq) за O(новых)
+    или подписываются на колбэк, который вызывается в потоке распознавания.
+    """
+
+    def __init__(self):
+        self._segments = []
+        self._lock = threading.Lock()
+        self._subscribers = []
+
+    def append(self, role, text, start, end, confidence=None):
+        with self._lock:
+            seg = Segment(len(self._segments) + 1, role, text, start, end, confidence=confidence)
+            self._segments.append(seg)
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(seg)
+            except Exception as e:
+                print(f"[ERROR] Подписчик транскрипта упал: {e}")
+        return seg
+
+    def segments_since(self, seq):
+        # seq совпадает с индексом следующей реплики в списке
+        with self._lock:
+            return self._segments[max(seq, 0):]
+
+    def segments_between(self, first_seq, last_seq):
+        """Реплики с номерами first_seq..last_seq включительно."""
+        with self._lock:
+            return self._segments[max(first_seq - 1, 0):max(last_seq, 0)]
+
+    @property
+    def last_seq(self):
+        with self._lock:
+            return len(self._segments)
+
+    def __len__(self):
+        return self.last_seq
+
+    def subscribe(self, callback):
+        """Подписка на новые реплики. Возвращает функцию отписки."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
@@ -0,0 +1,460 @@
+# Распознавание без GUI: один захват звука, сколько угодно потребителей. Реплики и
+# промежуточные гипотезы Recorder рассылаются по локальному TCP-сокету построчным
+# JSON (одно сообщение — одна строка). Оверлей, журнал для CRM или панель супервизора
+# подключаются как клиенты.
+#
+# Протокол. Сервер сразу шлёт {"type": "hello", "session": ..., "last_seq": N}.
+# Клиент отвечает {"cmd": "subscribe", "since": M, "partials": true} и получает
+# реплики с номером > M, затем поток сообщений:
+#   {"type": "segment", "seq", "role", "text", "start", "end", "wall_time", "confidence"}
+#   {"type": "partial", "role", "text"}     — пустой text: гипотеза финализирована
+#   {"type": "status", "running", "error", "stats"}
+# Команды {"cmd": "start"} и {"cmd": "stop"} включают и выключают прослушивание.
+#
+# Пример:
+#   python transcript_service.py                         # живой захват, порт 8766
+#   ADVISOR_SERVICE=127.0.0.1:8766 python main_overlay.py
+#   python transcript_service.py client.wav advisor.wav --loadtest 50
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+
+from metrics import LatencyStats, stages, STAGE_FINALIZE
+from transcript import SegmentStore
+from recorder import Recorder, MODE_THREAD, MODE_PROCESS
+from model_registry import MODEL_PATH
+from quality import QualityScheduler
+from timeline import REORDER_WINDOW
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8766
+# Сообщений в очереди одного подписчика, после чего он считается медленным и отключается
+BUFFER_SIZE = 256
+# Сколько байт может ждать в буфере сокета, прежде чем drain() начнёт ждать клиента
+WRITE_BUFFER_BYTES = 64 * 1024
+
+
+def _encode(message):
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode()
+
+
+def segment_message(seg):
+    return {"type": "segment", "seq": seg.seq, "role": seg.role, "text": seg.text,
+            "start": seg.start, "end": seg.end, "wall_time": seg.wall_time,
+            "confidence": seg.confidence}
+
+
+class Subscriber:
+    def __init__(self, writer, buffer_size):
+        self.writer = writer
+        self.queue = asyncio.Queue(buffer_size)
+        self.peer = writer.get_extra_info("peername")
+        self.partials = True
+        # Последняя отправленная реплика: рассылка и догрузка истории не дублируют друг друга
+        self.sent_seq = 0
+
+
+class TranscriptService:
+    """Рассылка реплик Recorder подписчикам в цикле asyncio.
+
+    Поток распознавания только ставит реплику в цикл (call_soon_threadsafe),
+    кодирование в JSON делается один раз на сообщение, а каждый подписчик
+    получает его через свою ограниченную очередь. Подписчик, который не
+    успевает читать, отключается, когда очередь переполнилась; остальные и
+    распознавание его не ждут. Промежуточные гипотезы опрашиваются раз в
+    partial_interval, без вмешательства в поток распознавания.
+    """
+
+    def __init__(self, recorder, buffer_size=BUFFER_SIZE, partial_interval=0.1, status_interval=1.0):
+        self.recorder = recorder
+        self.buffer_size = buffer_size
+        self.partial_interval = partial_interval
+        self.status_interval = status_interval
+        self.session = f"{time.time():.6f}"
+        self.subscribers = set()
+        self.stats = {"connections": 0, "messages": 0, "slow_disconnects": 0}
+        # Время рассылки одной реплики всем подписчикам (в цикле сервиса)
+        self.fanout = LatencyStats()
+        self.loop = None
+        self._server = None
+        self._tasks = []
+        self._unsubscribe = None
+
+    async def start(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        self.loop = asyncio.get_running_loop()
+        self._unsubscribe = self.recorder.segments.subscribe(self._on_segment)
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self._tasks = [asyncio.create_task(self._poll_partials()),
+                       asyncio.create_task(self._poll_status())]
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+        for task in self._tasks:
+            task.cancel()
+        self._server.close()
+        for sub in list(self.subscribers):
+            sub.writer.close()
+        await self._server.wait_closed()
+
+    # --- рассылка ---
+    def _on_segment(self, seg):
+        # Поток распознавания: только передаём реплику в цикл сервиса
+        self.loop.call_soon_threadsafe(self._publish_segment, seg)
+
+    def _publish_segment(self, seg):
+        started = time.perf_counter()
+        data = _encode(segment_message(seg))
+        for sub in list(self.subscribers):
+            if seg.seq > sub.sent_seq:
+                sub.sent_seq = seg.seq
+                self._offer(sub, data)
+        self.fanout.add(time.perf_counter() - started)
+
+    def _broadcast(self, message, partial=False):
+        data = _encode(message)
+        for sub in list(self.subscribers):
+            if not partial or sub.partials:
+                self._offer(sub, data)
+
+    def _offer(self, sub, data):
+        try:
+            sub.queue.put_nowait(data)
+            self.stats["messages"] += 1
+        except asyncio.QueueFull:
+            self.stats["slow_disconnects"] += 1
+            print(f"[DEBUG] Сервис: {sub.peer} не успевает читать, отключён")
+            self._drop(sub)
+
+    def _drop(self, sub):
+        self.subscribers.discard(sub)
+        # abort, а не close: не ждём, пока медленный клиент дочитает буфер
+        sub.writer.transport.abort()
+
+    def _status(self):
+        running = self.recorder.running
+        return {"type": "status", "running": running, "error": self.recorder.last_error,
+                "stats": self.recorder.get_stats() if running else {}}
+
+    async def _poll_partials(self):
+        last = {}
+        while True:
+            await asyncio.sleep(self.partial_interval)
+            current = dict(self.recorder.partial_text)
+            if current == last:
+                continue
+            for role in last.keys() | current.keys():
+                if current.get(role) != last.get(role):
+                    self._broadcast({"type": "partial", "role": role, "text": current.get(role, "")}, True)
+            last = current
+
+    async def _poll_status(self):
+        while True:
+            await asyncio.sleep(self.status_interval)
+            if self.subscribers:
+                self._broadcast(self._status())
+
+    # --- подписчики ---
+    async def _handle(self, reader, writer):
+        self.stats["connections"] += 1
+        # Ограничиваем и буфер ядра: иначе переставший читать клиент копит в нём мегабайты
+        writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, WRITE_BUFFER_BYTES)
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_BYTES)
+        sub = Subscriber(writer, self.buffer_size)
+        sender = asyncio.create_task(self._send(sub))
+        try:
+            writer.write(_encode({"type": "hello", "session": self.session,
+                                  "last_seq": self.recorder.segments.last_seq}))
+            async for line in reader:
+                try:
+                    command = json.loads(line)
+                except ValueError:
+                    continue
+                await self._command(sub, command)
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(sub)
+            sender.cancel()
+            writer.close()
+
+    async def _command(self, sub, command):
+        name = command.get("cmd")
+        if name == "subscribe":
+            sub.partials = bool(command.get("partials", True))
+            since = int(command.get("since", 0))
+            backlog = self.recorder.segments.segments_since(since)
+            sub.sent_seq = backlog[-1].seq if backlog else since
+            if backlog:
+                # История уходит одним куском и не занимает очередь подписчика
+                sub.writer.write(b"".join(_encode(segment_message(seg)) for seg in backlog))
+            self.subscribers.add(sub)
+            self._offer(sub, _encode(self._status()))
+        elif name == "start":
+            # start() ждёт модель и устройства — не в цикле рассылки
+            await self.loop.run_in_executor(None, self.recorder.start)
+            self._broadcast(self._status())
+        elif name == "stop":
+            self.recorder.stop()
+            self._broadcast(self._status())
+
+    async def _send(self, sub):
+        try:
+            while True:
+                data = await sub.queue.get()
+                sub.writer.write(data)
+                await sub.writer.drain()
+        except ConnectionError:
+            self.subscribers.discard(sub)
+
+    def get_stats(self):
+        return {**self.stats, "subscribers": len(self.subscribers), "fanout": self.fanout.summary()}
+
+
+class TranscriptClient:
+    """Подключение к сервису с тем же интерфейсом, что у Recorder в оверлее.
+
+    Реплики складываются в локальный SegmentStore, поэтому окно диалога и
+    контекст GPT работают с ним так же, как с локальным распознаванием.
+    После обрыва клиент переподключается и догружает пропущенные реплики.
+    """
+
+    streaming = True
+    remote = True
+
+    def __init__(self, host=SERVICE_HOST, port=SERVICE_PORT, partials=True, reconnect_delay=1.0):
+        self.host = host
+        self.port = port
+        self.partials = partials
+        self.reconnect_delay = reconnect_delay
+        self.segments = SegmentStore()
+        self.partial_text = {}
+        self.running = False
+        self.last_error = ""
+        self.stats = {}
+        self.connected = threading.Event()
+        self._session = None
+        # Номер последней реплики на стороне сервиса; локальные номера могут отличаться
+        self._server_seq = 0
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="service-client", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._closed.is_set():
+            try:
+                self._sock = socket.create_connection((self.host, self.port), timeout=5)
+                self._sock.settimeout(None)
+                with self._sock.makefile("rb") as f:
+                    for line in f:
+                        self._handle(json.loads(line))
+            except (OSError, ValueError) as e:
+                if not self._closed.is_set():
+                    print(f"[ERROR] Сервис распознавания {self.host}:{self.port}: {e}")
+            self.connected.clear()
+            self.partial_text.clear()
+            if not self._closed.is_set():
+                self.last_error = "❌ Нет связи с сервисом распознавания"
+            self._closed.wait(self.reconnect_delay)
+
+    def _handle(self, message):
+        kind = message.get("type")
+        if kind == "segment":
+            self._server_seq = message["seq"]
+            self.partial_text.pop(message["role"], None)
+            self.segments.append(message["role"], message["text"], message["start"], message["end"],
+                                 message.get("confidence"))
+        elif kind == "partial":
+            if message["text"]:
+                self.partial_text[message["role"]] = message["text"]
+            else:
+                self.partial_text.pop(message["role"], None)
+        elif kind == "status":
+            self.running = message["running"]
+            self.last_error = message.get("error") or ""
+            self.stats = message.get("stats") or {}
+        elif kind == "hello":
+            if message["session"] != self._session:
+                # Сервис перезапущен: его нумерация началась заново
+                self._session = message["session"]
+                self._server_seq = 0
+            self._send({"cmd": "subscribe", "since": self._server_seq, "partials": self.partials})
+            self.last_error = ""
+            self.connected.set()
+
+    def _send(self, command):
+        with self._send_lock:
+            if self._sock is None:
+                return False
+            try:
+                self._sock.sendall(_encode(command))
+                return True
+            except OSError:
+                return False
+
+    def on_model_ready(self, callback):
+        # Модель загружена в сервисе
+        callback(None, None)
+
+    def start(self):
+        if not self._send({"cmd": "start"}):
+            self.last_error = "❌ Нет связи с сервисом распознавания"
+
+    def stop(self):
+        self._send({"cmd": "stop"})
+
+    def close(self):
+        self._closed.set()
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+
+    def get_stats(self):
+        return self.stats
+
+    def get_partial_text(self):
+        return "\n".join(f"{role}: {text}…" for role, text in list(self.partial_text.items()))
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or SERVICE_HOST, int(port)
+
+
+def loadtest(args, files):
+    """Распознавание файлов с N подписчиками и без: задержка финализации и доставки."""
+    results = {}
+    for subscribers in (0, args.loadtest):
+        channels = [(name, name, None) for name in files]
+        recorder = Recorder(streaming=True, model_path=args.model, replay_files=files,
+                            replay_speed=args.speed, channels=channels, mode=args.mode, log_format=None)
+        recorder._ensure_recognizers()
+        service = TranscriptService(recorder, buffer_size=args.buffer)
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="service", daemon=True).start()
+        port = asyncio.run_coroutine_threadsafe(service.start(port=0), loop).result()
+
+        delivery = LatencyStats(window=1000000)
+        clients = [TranscriptClient(port=port) for _ in range(subscribers)]
+        for client in clients:
+            client.segments.subscribe(lambda seg: delivery.add(time.monotonic() - seg.end))
+            client.connected.wait(5)
+        stalled = None
+        if subscribers:
+            # Клиент, который подписался и перестал читать
+            stalled = socket.socket()
+            stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            stalled.connect((SERVICE_HOST, port))
+            stalled.sendall(_encode({"cmd": "subscribe", "since": 0}))
+        time.sleep(0.2)
+
+        stages.clear()
+        started = time.perf_counter()
+        recorder.start()
+        recorder.wait()
+        wall = time.perf_counter() - started
+        time.sleep(0.5)
+        segments = len(recorder.segments)
+        received = [len(client.segments) for client in clients]
+        result = {
+            "wall_seconds": round(wall, 2),
+            "segments": segments,
+            "all_received": all(n >= segments for n in received),
+            # От конца фразы до реплики в распознавателе и у подписчика
+            "finalize": stages.snapshot()[STAGE_FINALIZE],
+            "delivery": delivery.summary(),
+        }
+
+        if stalled is not None:
+            # Поток коротких реплик в темпе, за которым успевают обычные подписчики,
+            # пока не будет отключён переставший читать
+            text = "проверка медленного подписчика " * 20
+            for i in range(args.buffer * 100):
+                recorder.segments.append("burst", text, time.monotonic(), time.monotonic())
+                if i % 10 == 9:
+                    time.sleep(0.02)
+                if service.stats["slow_disconnects"]:
+                    break
+            time.sleep(0.5)
+            stalled.close()
+            result["connected_after_burst"] = sum(client.connected.is_set() for client in clients)
+        result["service"] = service.get_stats()
+        results[f"subscribers_{subscribers}"] = result
+        for client in clients:
+            client.close()
+        asyncio.run_coroutine_threadsafe(service.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        recorder.close()
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    loaded = results[f"subscribers_{args.loadtest}"]
+    # Отключён только переставший читать, остальные получили всё
+    ok = (loaded["all_received"] and loaded["service"]["slow_disconnects"] == 1
+          and loaded["connected_after_burst"] == args.loadtest)
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервис распознавания с рассылкой реплик по сокету")
+    parser.add_argument("client", nargs="?", help="WAV/PCM вместо захвата клиента")
+    parser.add_argument("advisor", nargs="?", help="WAV/PCM вместо захвата советника")
+    parser.add_argument("--speed", type=float, default=1.0, help="скорость воспроизведения файлов")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--buffer", type=int, default=BUFFER_SIZE, help="очередь подписчика, сообщений")
+    parser.add_argument("--mode", choices=[MODE_THREAD, MODE_PROCESS], default=MODE_THREAD)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--quality", action="store_true", help="менять модель и настройки по нагрузке")
+    parser.add_argument("--reorder-window", type=float, default=REORDER_WINDOW,
+                        help="сколько секунд реплика ждёт отстающий поток ради порядка по времени (0 — не ждать)")
+    parser.add_argument("--no-autostart", action="store_true", help="ждать команды start от клиента")
+    parser.add_argument("--loadtest", type=int, default=0, metavar="N",
+                        help="прогнать файлы с N подписчиками и без и сравнить задержки")
+    args = parser.parse_args()
+
+    files = {name: path for name, path in (("client", args.client), ("advisor", args.advisor)) if path}
+    if args.loadtest:
+        if not files:
+            parser.error("--loadtest нужны файлы")
+        return loadtest(args, files)
+
+    quality = QualityScheduler() if args.quality else None
+    if files:
+        channels = [(name, name, None) for name in files]
+        recorder = Recorder(streaming=True, model_path=args.model, replay_files=files,
+                            replay_speed=args.speed, channels=channels, mode=args.mode, quality=quality,
+                            reorder_window=args.reorder_window)
+    else:
+        recorder = Recorder(streaming=True, model_path=args.model, mode=args.mode, quality=quality,
+                            reorder_window=args.reorder_window)
+
+    async def serve():
+        service = TranscriptService(recorder, buffer_size=args.buffer)
+        port = await service.start(args.host, args.port)
+        print(f"Сервис распознавания: {args.host}:{port}")
+        if not args.no_autostart:
+            await asyncio.get_running_loop().run_in_executor(None, recorder.start)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex
+from PySide6.QtWidgets import QListView, QAbstractItemView
+
+import time
+
+
+def _normalize(text):
+    return text.lower().replace("ё", "е")
+
+
+class TranscriptModel(QAbstractListModel):
+    """Окно из не более чем max_rows подряд идущих реплик SegmentStore.
+
+    Все реплики живут в хранилище, модель держит только отображаемые строки,
+    поэтому отрисовка и раскладка не дорожают с длиной звонка. Пока окно
+    «прицеплено» к хвосту, новые реплики дописываются в конец, а лишние
+    строки сверху отбрасываются пачкой. Для поиска по всему звонку хранится
+    нормализованный текст каждой реплики, он пополняется за O(1) на реплику.
+    """
+
+    def __init__(self, store, max_rows=300, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.max_rows = max_rows
+        # Строки сверху отбрасываются не по одной, а пачками по trim_slack
+        self.trim_slack = max(1, max_rows // 5)
+        self._rows = []
+        self._texts = []
+
+    # --- Qt ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        seg = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return seg.line()
+        if role == Qt.ToolTipRole:
+            tip = time.strftime('%H:%M:%S', time.localtime(seg.wall_start))
+            if seg.confidence is not None:
+                tip += f", уверенность {seg.confidence:.2f}"
+            return tip
+        if role == Qt.UserRole:
+            return seg.seq
+        return None
+
+    # --- окно ---
+    @property
+    def first_seq(self):
+        return self._rows[0].seq if self._rows else len(self._texts) + 1
+
+    @property
+    def last_seq(self):
+        return self._rows[-1].seq if self._rows else len(self._texts)
+
+    @property
+    def attached(self):
+        # Окно показывает самые свежие реплики
+        return self.last_seq == len(self._texts)
+
+    def row_of(self, seq):
+        row = seq - self.first_seq
+        return row if 0 <= row < len(self._rows) else None
+
+    def pull(self):
+        """Забирает новые реплики из хранилища и возвращает их."""
+        attached = self.attached
+        new = self.store.segments_since(len(self._texts))
+        if not new:
+            return new
+        self._texts.extend(_normalize(seg.text) for seg in new)
+        if attached:
+            self._insert(len(self._rows), new)
+            self._trim_top()
+        return new
+
+    def load_older(self, count):
+        first = self.first_seq
+        older = self.store.segments_between(first - count, first - 1)
+        if not older:
+            return 0
+        self._insert(0, older)
+        if len(self._rows) > self.max_rows + self.trim_slack:
+            self._remove(self.max_rows, len(self._rows))
+        return len(older)
+
+    def load_newer(self, count):
+        last = self.last_seq
+        newer = self.store.segments_between(last + 1, last + count)
+        if not newer:
+            return 0
+        self._insert(len(self._rows), newer)
+        self._trim_top()
+        return len(newer)
+
+    def show_around(self, seq):
+        """Переставляет окно так, чтобы реплика seq была в его середине."""
+        first = max(1, seq - self.max_rows // 2)
+        self.beginResetModel()
+        self._rows = self.store.segments_between(first, first + self.max_rows - 1)
+        self.endResetModel()
+
+    def _trim_top(self):
+        if len(self._rows) > self.max_rows + self.trim_slack:
+            self._remove(0, len(self._rows) - self.max_rows)
+
+    def _insert(self, row, segments):
+        self.beginInsertRows(QModelIndex(), row, row + len(segments) - 1)
+        self._rows[row:row] = segments
+        self.endInsertRows()
+
+    def _remove(self, start, end):
+        self.beginRemoveRows(QModelIndex(), start, end - 1)
+        del self._rows[start:end]
+        self.endRemoveRows()
+
+    # --- поиск ---
+    def find(self, query, after_seq=0, backwards=False):
+        """Номер следующей (или предыдущей) реплики с query, по кругу; None — нет совпадений."""
+        query = _normalize(query.strip())
+        if not query:
+            return None
+        n = len(self._texts)
+        if backwards:
+            order = list(range(after_seq - 2, -1, -1)) + list(range(n - 1, after_seq - 2, -1))
+        else:
+            order = list(range(after_seq, n)) + list(range(0, min(after_seq, n)))
+        for i in order:
+            if query in self._texts[i]:
+                return i + 1
+        return None
+
+    def count(self, query):
+        query = _normalize(query.strip())
+        return sum(query in text for text in self._texts) if query else 0
+
+
+class TranscriptView(QListView):
+    """Список реплик с подгрузкой старых при прокрутке вверх.
+
+    Пока пользователь внизу, вид следует за новыми репликами; стоит
+    прокрутить вверх — окно остаётся на месте, а новые реплики только
+    попадают в поиск и подгрузятся, когда он вернётся вниз.
+    """
+
+    def __init__(self, store, max_rows=300, page=50, parent=None):
+        super().__init__(parent)
+        self.page = page
+        self.following = True
+        self._loading = False
+        self.transcript_model = TranscriptModel(store, max_rows, self)
+        self.setModel(self.transcript_model)
+        self.setWordWrap(True)
+        self.setUniformItemSizes(False)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
+    def refresh(self):
+        """Подтягивает новые реплики из хранилища и возвращает их."""
+        new = self.transcript_model.pull()
+        if new and self.following:
+            self.scrollToBottom()
+        return new
+
+    def _on_scroll(self, value):
+        if self._loading:
+            return
+        bar = self.verticalScrollBar()
+        model = self.transcript_model
+        self._loading = True
+        try:
+            if value == bar.minimum() and model.first_seq > 1:
+                self.following = False
+                top_seq = model.first_seq
+                model.load_older(self.page)
+                # Сохраняем на месте реплику, которая была наверху
+                self.scrollTo(model.index(model.row_of(top_seq)), QAbstractItemView.PositionAtTop)
+            elif value == bar.maximum():
+                if model.attached:
+                    self.following = True
+                else:
+                    bottom_seq = model.last_seq
+                    model.load_newer(self.page)
+                    self.scrollTo(model.index(model.row_of(bottom_seq)), QAbstractItemView.PositionAtBottom)
+            else:
+                self.following = False
+        finally:
+            self._loading = False
+
+    def find(self, query, backwards=False):
+        """Выделяет следующее совпадение. Возвращает (номер реплики, всего совпадений)."""
+        model = self.transcript_model
+        current = self.currentIndex()
+        after = current.data(Qt.UserRole) if current.isValid() else 0
+        seq = model.find(query, after, backwards)
+        if seq is None:
+            return None, 0
+        self.following = False
+        if model.row_of(seq) is None:
+            self._loading = True
+            model.show_around(seq)
+            self._loading = False
+        index = model.index(model.row_of(seq))
+        self.setCurrentIndex(index)
+        self.scrollTo(index, QAbstractItemView.PositionAtCenter)
+        return seq, model.count(query)
@@ -0,0 +1,112 @@
+import collections
+import time
+
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """Детектор речи по энергии и частоте переходов через ноль (ZCR).
+
+    Блок режется на кадры frame_ms, признаки считаются сразу для всех кадров.
+    Кадр речевой, если его энергия выше порога: абсолютного threshold_db или
+    уровня шума плюс margin_db, смотря что выше. Уровень шума подстраивается по
+    тихим кадрам. Кадр с высокой ZCR при энергии чуть выше порога считается
+    шипением, а не речью. Блок речевой, если в нём набирается min_speech_ms
+    речевых кадров.
+
+    После речи ещё hangover секунд блоки идут в декодер, чтобы не обрезать
+    затухающие окончания. Последние preroll секунд тишины придерживаются и
+    уходят в декодер перед первым речевым блоком.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=20, threshold_db=-50.0, margin_db=10.0,
+                 zcr_max=0.4, min_speech_ms=60, hangover=0.4, preroll=0.3):
+        self.sample_rate = sample_rate
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.frame_ms = frame_ms
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.zcr_max = zcr_max
+        self.min_speech_ms = min_speech_ms
+        self.hangover = hangover
+        self.preroll = preroll
+        self.noise_db = None
+        self.active = False
+        self._hang_left = 0.0
+        self._preroll = collections.deque()
+        self._preroll_seconds = 0.0
+        self.stats = {"skipped_seconds": 0.0, "vad_seconds": 0.0, "utterances": 0}
+
+    def is_speech(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        n = len(samples) // self.frame_len * self.frame_len
+        if not n:
+            return False
+        frames = samples[:n].reshape(-1, self.frame_len).astype(np.float32)
+        energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) / 32768.0 ** 2 + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        if self.noise_db is None:
+            self.noise_db = float(np.percentile(energy_db, 10))
+        threshold = max(self.threshold_db, self.noise_db + self.margin_db)
+        speech = (energy_db > threshold) & ((zcr < self.zcr_max) | (energy_db > threshold + 6))
+
+        quiet = energy_db[~speech]
+        if quiet.size:
+            level = float(np.median(quiet))
+            # Шум падает мгновенно, а растёт медленно, чтобы тихая речь не стала «шумом»
+            self.noise_db = level if level < self.noise_db else self.noise_db + 0.05 * (level - self.noise_db)
+        return np.count_nonzero(speech) * self.frame_ms >= self.min_speech_ms
+
+    def process(self, captured_at, data):
+        """Блоки для декодера и признак конца фразы.
+
+        Возвращает (blocks, ended). blocks — список (captured_at, data), возможно
+        с придержанной тишиной перед речью. ended=True, когда истекло удержание
+        после речи: реплику пора финализировать.
+        """
+        started = time.perf_counter()
+        seconds = len(data) / 2 / self.sample_rate
+        blocks, ended = [], False
+        if self.is_speech(data):
+            if not self.active:
+                self.stats["utterances"] += 1
+            blocks = list(self._preroll)
+            blocks.append((captured_at, data))
+            self._preroll.clear()
+            self._preroll_seconds = 0.0
+            self.active = True
+            self._hang_left = self.hangover
+        elif self.active:
+            blocks = [(captured_at, data)]
+            self._hang_left -= seconds
+            if self._hang_left <= 0:
+                self.active = False
+                ended = True
+        else:
+            # Данные могут указывать в переиспользуемый буфер — придерживаем копию
+            self._preroll.append((captured_at, bytes(data)))
+            self._preroll_seconds += seconds
+            while self._preroll and self._preroll_seconds - self._block_seconds(self._preroll[0]) >= self.preroll:
+                dropped = self._block_seconds(self._preroll.popleft())
+                self._preroll_seconds -= dropped
+                self.stats["skipped_seconds"] += dropped
+        self.stats["vad_seconds"] += time.perf_counter() - started
+        return blocks, ended
+
+    def held_since(self):
+        """Начало старейшего придержанного блока (часы захвата) или None."""
+        if not self._preroll:
+            return None
+        captured_at = self._preroll[0][0]
+        return captured_at - self._block_seconds(self._preroll[0])
+
+    def _block_seconds(self, block):
+        return len(block[1]) / 2 / self.sample_rate
+
+    def reset(self):
+        self.active = False
+        self._hang_left = 0.0
+        self._preroll.clear()
+        self._preroll_seconds = 0.0